@@ -1,29 +1,171 @@
-from typing import Optional, Union, Literal
-import io
+from typing import Any, Optional, Union, Literal, List, Hashable
+from contextlib import asynccontextmanager
+import asyncio
+import html
 
-from fastapi import FastAPI, Query
-from fastapi.responses import Response
+from fastapi import FastAPI, Query, Header, Depends
+from fastapi.responses import Response, PlainTextResponse, JSONResponse
 from pydantic import ValidationError
+import httpx
 
 from src.cards.stats import StatsCard, StatsOption
 from src.cards.heatmap import HeatmapCard, HeatmapOption, Type as HeatmapType
 from src.cards.error import ErrorCard
-from src.atcoder import Atcoder as atcoder
+from src.cards.grid import GridCard
+from src.atcoder import Atcoder as atcoder, UserData
 from src.atcoder_problems import AtcoderProblems as ap
+from src.submission_table import SubmissionTable
+from src.day_buckets import DayBuckets
 from src.themes import THEMES
+from src.client import UpstreamClient, UpstreamError
+from src.cache import LRUCache, SWRCache, cache_key, make_etag
+from src.encoding import EncodedBody, choose_encoding, etag_header, etag_matches
+from src.timing import ServerTimingMiddleware, Timings, add_hook, slow_request_logger
+from src.metrics import REGISTRY, REQUEST_SECONDS, ERROR_CARDS, status_label
+from src.tracing import TracingMiddleware, jsonl_sink
+from src.config import (
+    SVG_CACHE_MAX_BYTES,
+    DATA_CACHE_SOFT_TTL,
+    DATA_CACHE_HARD_TTL,
+    DATA_CACHE_MAX_ENTRIES,
+    MINIFY_SVG,
+    SLOW_REQUEST_LOG_MS,
+    TRACE_SAMPLE_RATE,
+    TRACE_SLOW_MS,
+    TRACE_FILE,
+    TRACE_FILE_MAX_BYTES,
+    TRACE_FILE_BACKUP_COUNT,
+    BATCH_MAX_USERS,
+    BATCH_CONCURRENCY,
+)
 from src.const import ONE_DAY_SECOND
 
 Auto = Literal["auto"]
 
+CACHE_MAX_AGE = ONE_DAY_SECOND // 2
 
-app = FastAPI()
+CACHE_HEADERS = {
+    "Cache-Control": f"max-age={CACHE_MAX_AGE},stale-while-revalidate={ONE_DAY_SECOND},s-maxage={ONE_DAY_SECOND}",
+}
+NO_CACHE_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+}
 
+# 生成済みの SVG と圧縮済みのもの (Cache-Control の max-age と同じ期間だけ保持する)
+svg_cache = LRUCache(max_bytes=SVG_CACHE_MAX_BYTES, ttl=CACHE_MAX_AGE)
+# 取得済みの UserData / 提出 (古くなったら裏で取り直す)
+data_cache = SWRCache(
+    soft_ttl=DATA_CACHE_SOFT_TTL,
+    hard_ttl=DATA_CACHE_HARD_TTL,
+    max_entries=DATA_CACHE_MAX_ENTRIES,
+)
 
-@app.get("/stats/{username}")
-async def stats(
-    # path parameter
-    username: str,
-    # query parameter
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await UpstreamClient.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+# 処理ごとの時間を Server-Timing ヘッダーで返す
+app.add_middleware(ServerTimingMiddleware)
+if SLOW_REQUEST_LOG_MS > 0:
+    add_hook(slow_request_logger(SLOW_REQUEST_LOG_MS / 1000))
+# 一部のリクエストと遅いリクエストの内訳をファイルに残す
+if TRACE_SAMPLE_RATE > 0 or TRACE_SLOW_MS > 0:
+    app.add_middleware(
+        TracingMiddleware,
+        sink=jsonl_sink(TRACE_FILE, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUP_COUNT),
+        sample_rate=TRACE_SAMPLE_RATE,
+        slow_threshold=TRACE_SLOW_MS / 1000,
+    )
+
+
+def observe_request(path: str, timings: Timings) -> None:
+    # ルートにマッチしなかったパスはまとめる (ラベルが増えすぎないように)
+    REQUEST_SECONDS.observe(
+        timings.totals().get("total", 0.0),
+        route=timings.route or "unmatched",
+        status=status_label(timings.status),
+    )
+
+
+add_hook(observe_request)
+
+
+def collect_cache_counts():
+    for name, cache in (("svg", svg_cache), ("data", data_cache)):
+        for stat, value in cache.stats().items():
+            if stat not in ("entries", "bytes"):
+                yield (name, stat), value
+
+
+def collect_cache_sizes():
+    yield ("svg", "entries"), len(svg_cache)
+    yield ("svg", "bytes"), svg_cache.size
+    yield ("data", "entries"), len(data_cache)
+
+
+REGISTRY.gauge(
+    "cache_events_total",
+    "Cache lookups and evictions by result.",
+    ["cache", "event"],
+    collect_cache_counts,
+    type_="counter",
+)
+REGISTRY.gauge("cache_size", "Cache size.", ["cache", "unit"], collect_cache_sizes)
+
+
+def svg_response(
+    body: EncodedBody,
+    accept_encoding: Optional[str],
+    headers: dict[str, str],
+    if_none_match: Optional[str] = None,
+) -> Response:
+    if body.etag is not None and etag_matches(if_none_match, body.etag):
+        return not_modified_response(body.etag, accept_encoding, headers)
+
+    # Accept-Encoding に合わせて圧縮済みのものを返す (ここでは圧縮しない)
+    encoding, content = body.negotiate(accept_encoding)
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    if body.etag is not None:
+        headers["ETag"] = etag_header(body.etag, encoding)
+    return Response(content=content, headers=headers, media_type="image/svg+xml")
+
+
+def not_modified_response(
+    etag: str, accept_encoding: Optional[str], headers: dict[str, str]
+) -> Response:
+    encoding = choose_encoding(accept_encoding)
+    headers = {**headers, "Vary": "Accept-Encoding", "ETag": etag_header(etag, encoding)}
+    return Response(status_code=304, headers=headers)
+
+
+def error_cause(e: Exception) -> str:
+    if isinstance(e, UpstreamError):
+        return "upstream_unavailable"
+    if isinstance(e, httpx.HTTPStatusError):
+        return "upstream_status"
+    if isinstance(e, ValidationError):
+        return "invalid_upstream_data"
+    if isinstance(e, ValueError):
+        return "user_not_found"
+    return "other"
+
+
+def error_response(
+    card: ErrorCard, accept_encoding: Optional[str], endpoint: str, cause: str
+) -> Response:
+    ERROR_CARDS.inc(endpoint=endpoint, cause=cause)
+    # エラーカードはキャッシュしないので圧縮もしない
+    body = EncodedBody(identity=card.render(minify=MINIFY_SVG).encode())
+    return svg_response(body, accept_encoding, NO_CACHE_HEADERS)
+
+
+def stats_option(
     width: Optional[Union[int, Auto]] = None,
     height: Optional[Union[int, Auto]] = None,
     hide: Optional[str] = None,  # ex: hide=rating,last_competed
@@ -31,7 +173,7 @@ async def stats(
     show_history: Optional[Union[int, bool]] = False,
     show_icons: Optional[bool] = False,
     disable_animations: Optional[bool] = False,
-):
+) -> StatsOption:
     option = StatsOption()
     if width:
         option.width = width
@@ -47,39 +189,196 @@ async def stats(
         option.show_icons = show_icons
     if disable_animations:
         option.disable_animations = disable_animations
+    return option
 
-    try:
-        userdata = atcoder.fetch_userdata(username, need_compe=bool(show_history))
-    except ValueError as e:
-        card = ErrorCard(e.args[0], e.args[1])
-        svg = io.BytesIO(bytes(card.render(), "utf-8")).getvalue()
-        headers = {
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-        }
-        return Response(content=svg, headers=headers, media_type="image/svg+xml")
 
-    card = StatsCard(userdata, option)
-    svg = io.BytesIO(bytes(card.render(), "utf-8")).getvalue()
+async def fetch_stats_userdata(username: str, option: StatsOption) -> UserData:
+    need_compe = bool(option.show_history)
+    need_rank = "rank" not in option.hide
+    return await data_cache.get(
+        ("userdata", username, need_compe, need_rank),
+        lambda: atcoder.fetch_userdata(
+            username, need_compe=need_compe, need_rank=need_rank
+        ),
+    )
 
-    headers = {
-        "Cache-Control": f"max-age={ONE_DAY_SECOND // 2},stale-while-revalidate={ONE_DAY_SECOND},s-maxage={ONE_DAY_SECOND}",
-    }
 
-    return Response(content=svg, headers=headers, media_type="image/svg+xml")
+def stats_etag(key: Hashable, userdata: UserData) -> str:
+    # データとオプションだけで ETag を決める (描画しなくてよい)
+    return make_etag(key, MINIFY_SVG, userdata.model_dump_json())
 
 
-@app.get("/heatmap/{username}")
-async def heatmap(
+def render_stats(key: Hashable, userdata: UserData, option: StatsOption) -> EncodedBody:
+    card = StatsCard(userdata, option)
+    # 圧縮は生成したときの1回だけ
+    body = EncodedBody.compress(
+        card.render(minify=MINIFY_SVG).encode(), stats_etag(key, userdata)
+    )
+    svg_cache.set(key, body)
+    return body
+
+
+@app.get("/stats/{username}")
+async def stats(
     # path parameter
     username: str,
     # query parameter
+    option: StatsOption = Depends(stats_option),
+    # header
+    accept_encoding: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    key = cache_key("stats", username, option)
+    body = svg_cache.get(key)
+    if body is not None:
+        return svg_response(
+            body, accept_encoding, {**CACHE_HEADERS, "X-Cache": "HIT"}, if_none_match
+        )
+
+    try:
+        userdata = await fetch_stats_userdata(username, option)
+    except (ValueError, UpstreamError) as e:
+        return error_response(
+            ErrorCard(e.args[0], e.args[1]), accept_encoding, "stats", error_cause(e)
+        )
+
+    # 変わっていなければ描画しない
+    headers = {**CACHE_HEADERS, "X-Cache": "MISS"}
+    etag = stats_etag(key, userdata)
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag, accept_encoding, headers)
+
+    body = render_stats(key, userdata, option)
+
+    return svg_response(body, accept_encoding, headers)
+
+
+def parse_usernames(users: str) -> List[str]:
+    # 重複と空の要素を除く (順序は保つ)
+    usernames = list(dict.fromkeys(u.strip() for u in users.split(",") if u.strip()))
+    if not usernames:
+        raise ValueError("No Users.", "Please specify usernames. ex: users=user1,user2")
+    if len(usernames) > BATCH_MAX_USERS:
+        raise ValueError(
+            "Too Many Users.", f"Up to {BATCH_MAX_USERS} users can be specified."
+        )
+    return usernames
+
+
+async def batch_stats(
+    usernames: List[str], option: StatsOption
+) -> List[Union[EncodedBody, ErrorCard]]:
+    # 全員分を同時に取得する (上流への同時リクエストは BATCH_CONCURRENCY 人まで)
+    # 描画したカードは /stats/{username} と同じキャッシュに入れる
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def fetch(username: str) -> Union[EncodedBody, ErrorCard]:
+        key = cache_key("stats", username, option)
+        body = svg_cache.get(key)
+        if body is not None:
+            return body
+        try:
+            async with semaphore:
+                userdata = await fetch_stats_userdata(username, option)
+        except (ValueError, UpstreamError) as e:
+            ERROR_CARDS.inc(endpoint="stats_batch", cause=error_cause(e))
+            return ErrorCard(e.args[0], f"{username}: {e.args[1]}")
+        return render_stats(key, userdata, option)
+
+    return await asyncio.gather(*(fetch(username) for username in usernames))
+
+
+@app.get("/stats")
+async def stats_grid(
+    # query parameter
+    users: str,  # ex: users=user1,user2
+    columns: int = Query(default=2, ge=1),
+    option: StatsOption = Depends(stats_option),
+    # header
+    accept_encoding: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    try:
+        usernames = parse_usernames(users)
+    except ValueError as e:
+        return error_response(
+            ErrorCard(e.args[0], e.args[1]), accept_encoding, "stats_batch", "invalid_option"
+        )
+
+    key = (cache_key("stats_grid", ",".join(usernames), option), columns)
+    body = svg_cache.get(key)
+    if body is not None:
+        return svg_response(
+            body, accept_encoding, {**CACHE_HEADERS, "X-Cache": "HIT"}, if_none_match
+        )
+
+    panels = await batch_stats(usernames, option)
+    svgs = [
+        p.identity if isinstance(p, EncodedBody) else p.render(minify=MINIFY_SVG).encode()
+        for p in panels
+    ]
+    grid = GridCard(svgs, columns=columns).render().encode()
+
+    # 取得できなかったユーザーがいる場合はキャッシュしない
+    bodies = [p for p in panels if isinstance(p, EncodedBody)]
+    if len(bodies) != len(panels):
+        return svg_response(EncodedBody(identity=grid), accept_encoding, NO_CACHE_HEADERS)
+
+    etag = make_etag(key, *(b.etag for b in bodies))
+    headers = {**CACHE_HEADERS, "X-Cache": "MISS"}
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag, accept_encoding, headers)
+
+    body = EncodedBody.compress(grid, etag)
+    svg_cache.set(key, body)
+
+    return svg_response(body, accept_encoding, headers)
+
+
+@app.get("/stats.json")
+async def stats_bundle(
+    # query parameter
+    users: str,  # ex: users=user1,user2
+    option: StatsOption = Depends(stats_option),
+):
+    # ユーザーごとの SVG をまとめて返す
+    try:
+        usernames = parse_usernames(users)
+    except ValueError as e:
+        ERROR_CARDS.inc(endpoint="stats_batch", cause="invalid_option")
+        return JSONResponse(
+            {"error": {"message": e.args[0], "secondary_message": e.args[1]}},
+            status_code=400,
+            headers=NO_CACHE_HEADERS,
+        )
+
+    panels = await batch_stats(usernames, option)
+    cards: List[dict[str, Any]] = []
+    for username, p in zip(usernames, panels):
+        if isinstance(p, EncodedBody):
+            cards.append({"username": username, "svg": p.identity.decode(), "error": None})
+        else:
+            cards.append(
+                {
+                    "username": username,
+                    "svg": p.render(minify=MINIFY_SVG),
+                    "error": {"message": p.message, "secondary_message": p.secondary_message},
+                }
+            )
+
+    failed = any(card["error"] for card in cards)
+    return JSONResponse({"cards": cards}, headers=NO_CACHE_HEADERS if failed else CACHE_HEADERS)
+
+
+def heatmap_option(
     width: Optional[Union[int, Auto]] = None,
     height: Optional[Union[int, Auto]] = None,
     theme: Optional[str] = None,
     type: Optional[HeatmapType] = None,
     title_lines: Optional[int] = Query(default=None, ge=1),
     disable_animations: Optional[bool] = False,
-):
+    tz: Optional[str] = None,  # ex: tz=JST, tz=+09:00
+) -> HeatmapOption:
     option = HeatmapOption()
     if width:
         option.width = width
@@ -93,25 +392,173 @@ async def heatmap(
         option.title_lines = title_lines
     if disable_animations:
         option.disable_animations = disable_animations
+    if tz:
+        option.tz = tz
+    return option
 
-    try:
-        submissions = ap.fetch_submissions(username)
-    except ValidationError as e:
+
+async def fetch_heatmap_submissions(username: str, from_unix_second: int) -> SubmissionTable:
+    # カードに表示される期間の提出だけを取得する
+    return await data_cache.get(
+        ("submissions", username, from_unix_second),
+        lambda: ap.fetch_submission_table(username, from_unix_second=from_unix_second),
+    )
+
+
+def submissions_error_card(e: Exception) -> ErrorCard:
+    if isinstance(e, ValidationError):
         err = e.errors()[0]
-        card = ErrorCard(f'Location: {err.get("loc")}, Input: {err.get("input")}', err.get("msg"))
-        headers = {
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-        }
+        return ErrorCard(f'Location: {err.get("loc")}, Input: {err.get("input")}', err.get("msg"))
+    return ErrorCard(*e.args)
+
+
+@app.get("/heatmap/{username}")
+async def heatmap(
+    # path parameter
+    username: str,
+    # query parameter
+    option: HeatmapOption = Depends(heatmap_option),
+    # header
+    accept_encoding: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    try:
+        today = HeatmapCard.today(option.tz)
+    except ValueError as e:
+        return error_response(
+            ErrorCard(e.args[0], e.args[1]), accept_encoding, "heatmap", "invalid_option"
+        )
+
+    # 表示期間は日付で変わるのでキーに含める
+    key = cache_key(f"heatmap:{today.date()}", username, option)
+    body = svg_cache.get(key)
+    if body is not None:
+        return svg_response(
+            body, accept_encoding, {**CACHE_HEADERS, "X-Cache": "HIT"}, if_none_match
+        )
+
+    try:
+        from_unix_second = HeatmapCard.window_start_second(option.tz)
+        submissions = await fetch_heatmap_submissions(username, from_unix_second)
     except Exception as e:
-        card = ErrorCard(*e.args)
-        headers = {
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-        }
-    else:
-        card = HeatmapCard(username, submissions, option)
-        headers = {
-            "Cache-Control": f"max-age={ONE_DAY_SECOND // 2},stale-while-revalidate={ONE_DAY_SECOND},s-maxage={ONE_DAY_SECOND}",
-        }
-
-    svg = io.BytesIO(bytes(card.render(), "utf-8")).getvalue()
-    return Response(content=svg, headers=headers, media_type="image/svg+xml")
+        return error_response(
+            submissions_error_card(e), accept_encoding, "heatmap", error_cause(e)
+        )
+
+    # データとオプションだけで ETag を決め、変わっていなければ描画しない
+    headers = {**CACHE_HEADERS, "X-Cache": "MISS"}
+    etag = make_etag(key, MINIFY_SVG, submissions.fingerprint())
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag, accept_encoding, headers)
+
+    card = HeatmapCard(username, submissions, option)
+    # 圧縮は生成したときの1回だけ
+    body = EncodedBody.compress(card.render(minify=MINIFY_SVG).encode(), etag)
+    svg_cache.set(key, body)
+
+    return svg_response(body, accept_encoding, headers)
+
+
+async def fetch_member_buckets(
+    username: str, window: DayBuckets, type_: HeatmapType
+) -> DayBuckets:
+    # チームのヒートマップ用に、1人分の日ごとの提出数だけをキャッシュする
+    # 提出のテーブルは data_cache に入れず、数え終わったら捨てる
+    # (メモリは 人数 x 日数 のカウントと、同時に取得している BATCH_CONCURRENCY 人分のテーブルまで)
+    async def count() -> DayBuckets:
+        member = DayBuckets(window.start_day, window.days, window.offset)
+        table = await ap.fetch_submission_table(username, from_unix_second=window.start_second)
+        member.add_submissions(table, type_)
+        return member
+
+    return await data_cache.get(
+        ("heatmap_buckets", username, window.start_day, window.days, window.offset, type_),
+        count,
+    )
+
+
+# チームのヒートマップで、誰の取得に失敗したか
+class TeamMemberError(Exception):
+    def __init__(
+        self, username: str, message: str, secondary_message: str, cause: Exception
+    ) -> None:
+        super().__init__(message, secondary_message)
+        self.username = username
+        self.message = message
+        self.secondary_message = secondary_message
+        self.cause = cause
+
+
+@app.get("/heatmap")
+async def heatmap_team(
+    # query parameter
+    users: str,  # ex: users=user1,user2
+    name: Optional[str] = None,  # タイトルに表示する名前 (ex: name=Team)
+    option: HeatmapOption = Depends(heatmap_option),
+    # header
+    accept_encoding: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    try:
+        usernames = parse_usernames(users)
+        today = HeatmapCard.today(option.tz)
+        buckets = HeatmapCard.window_buckets(option.tz)
+    except ValueError as e:
+        return error_response(
+            ErrorCard(e.args[0], e.args[1]), accept_encoding, "heatmap_team", "invalid_option"
+        )
+
+    title = html.escape(name) if name else ", ".join(html.escape(u) for u in usernames)
+    key = (cache_key(f"heatmap_team:{today.date()}", ",".join(usernames), option), title)
+    body = svg_cache.get(key)
+    if body is not None:
+        return svg_response(
+            body, accept_encoding, {**CACHE_HEADERS, "X-Cache": "HIT"}, if_none_match
+        )
+
+    # 全員分を同時に取得し、取得できた順に日ごとの提出数へ足していく
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def add(username: str) -> None:
+        try:
+            async with semaphore:
+                member = await fetch_member_buckets(username, buckets, option.type)
+        except Exception as e:
+            card = submissions_error_card(e)
+            raise TeamMemberError(
+                username, card.message, f"{username}: {card.secondary_message}", e
+            ) from e
+        buckets.merge(member)
+
+    try:
+        await asyncio.gather(*(add(username) for username in usernames))
+    except TeamMemberError as e:
+        return error_response(
+            ErrorCard(e.message, e.secondary_message),
+            accept_encoding,
+            "heatmap_team",
+            error_cause(e.cause),
+        )
+
+    headers = {**CACHE_HEADERS, "X-Cache": "MISS"}
+    etag = make_etag(key, MINIFY_SVG, buckets.start_day, buckets.counts)
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag, accept_encoding, headers)
+
+    card = HeatmapCard(title, buckets, option)
+    body = EncodedBody.compress(card.render(minify=MINIFY_SVG).encode(), etag)
+    svg_cache.set(key, body)
+
+    return svg_response(body, accept_encoding, headers)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"svg": svg_cache.stats(), "data": data_cache.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,123 @@
+# 上流の JSON (提出・コンテスト履歴) のデコード速度 (rows/s) を比較する
+#
+#   python -m benchmarks.bench_decode [rows ...]
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from src.atcoder import Competition, COMPETITIONS_ADAPTER
+from src.atcoder_problems import Submission, SUBMISSIONS_ADAPTER
+from src.submission_table import SubmissionTable
+
+DEFAULT_ROWS = [1_000, 50_000]
+RESULTS = ["AC", "AC", "AC", "WA", "TLE", "RE", "CE"]
+LANGUAGES = ["C++ 20 (gcc 12.2)", "Python (PyPy 3.10-v7.3.12)", "Rust (rustc 1.70.0)"]
+
+
+def make_submissions_json(n: int, start_second: int = 1600000000, interval: int = 600) -> bytes:
+    rows = [
+        {
+            "id": 40000000 + i,
+            "epoch_second": start_second + i * interval,
+            "problem_id": f"abc{100 + i % 250}_{'abcdefg'[i % 7]}",
+            "contest_id": f"abc{100 + i % 250}",
+            "user_id": "bench_user",
+            "language": LANGUAGES[i % len(LANGUAGES)],
+            "point": 100.0 * (i % 6),
+            "length": 200 + i % 3000,
+            "result": RESULTS[i % len(RESULTS)],
+            "execution_time": None if i % 7 == 6 else i % 2000,
+        }
+        for i in range(n)
+    ]
+    return json.dumps(rows).encode()
+
+
+def make_history_json(n: int) -> bytes:
+    jst = timezone(timedelta(hours=9))
+    rows = [
+        {
+            "IsRated": i % 5 != 0,
+            "Place": 1000 + i,
+            "OldRating": 800 + i,
+            "NewRating": 801 + i,
+            "Performance": 900 + i,
+            "InnerPerformance": 900 + i,
+            "ContestScreenName": f"abc{i}.contest.atcoder.jp",
+            "ContestName": f"AtCoder Beginner Contest {i}",
+            "ContestNameEn": f"AtCoder Beginner Contest {i}",
+            "EndTime": (datetime(2020, 1, 1, 22, 40, tzinfo=jst) + timedelta(days=7 * i)).isoformat(),
+        }
+        for i in range(n)
+    ]
+    return json.dumps(rows).encode()
+
+
+# 以前の実装
+def legacy_submissions(content: bytes) -> list:
+    return [Submission(**v) for v in json.loads(content)]
+
+
+def legacy_history(content: bytes) -> list:
+    return [
+        Competition(
+            date=datetime.strptime(c["EndTime"], "%Y-%m-%dT%H:%M:%S%z"),
+            contest_jp=c["ContestName"],
+            contest_en=c["ContestNameEn"],
+            is_rated=c["IsRated"],
+            rank=c["Place"],
+            performance=c["Performance"],
+            old_rating=c["OldRating"],
+            new_rating=c["NewRating"],
+        )
+        for c in json.loads(content)
+    ]
+
+
+def rows_per_second(fn: Callable[[], object], rows: int, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return rows / best
+
+
+def report(name: str, legacy: float, current: float) -> None:
+    print(f"  {name:<28} legacy {legacy:>12,.0f} rows/s   current {current:>12,.0f} rows/s   {current / legacy:5.1f}x")
+
+
+def bench(sizes: list[int]) -> None:
+    for n in sizes:
+        print(f"{n:,} rows")
+
+        content = make_submissions_json(n)
+        report(
+            "submissions (validate)",
+            rows_per_second(lambda: legacy_submissions(content), n),
+            rows_per_second(lambda: SUBMISSIONS_ADAPTER.validate_json(content), n),
+        )
+
+        # 保存済みのテーブルから読み出す場合
+        table = SubmissionTable.from_rows(SUBMISSIONS_ADAPTER.validate_json(content))
+        legacy_cached = rows_per_second(lambda: [Submission(**r) for r in table.to_dicts()], n)
+        report(
+            "cached (validate)",
+            legacy_cached,
+            rows_per_second(lambda: SUBMISSIONS_ADAPTER.validate_python(table.to_dicts()), n),
+        )
+        report("cached (trusted)", legacy_cached, rows_per_second(lambda: list(table), n))
+
+        history_rows = min(n, 5_000)
+        history = make_history_json(history_rows)
+        report(
+            "competition history",
+            rows_per_second(lambda: legacy_history(history), history_rows),
+            rows_per_second(lambda: COMPETITIONS_ADAPTER.validate_json(history), history_rows),
+        )
+
+
+if __name__ == "__main__":
+    bench([int(n) for n in sys.argv[1:]] or DEFAULT_ROWS)
@@ -0,0 +1,70 @@
+# 保存済みのプロフィールページを使って、プロフィールの解析にかかる CPU 時間を比較する
+#
+#   python -m benchmarks.bench_profile_parse [profile.html ...]
+import asyncio
+import re
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from src.atcoder import Atcoder
+from tests.utils import AsyncChunks
+
+DEFAULT_PAGES = ["tests/html/profile.html"]
+
+
+# 以前の実装 (html.parser でページ全体のツリーを作り、項目ごとに soup.find する)
+def legacy_parse(content: bytes) -> dict:
+    soup = BeautifulSoup(content, "html.parser")
+
+    def value_after(label):
+        tag = soup.find("th", string=label)
+        return tag.next_sibling if tag else None
+
+    rank_tag = value_after("Rank")
+    rating_tag = value_after("Rating")
+    highest_tag = value_after("Highest Rating")
+    last_tag = value_after("Last Competed")
+    rated_label = soup.find(string=re.compile("Rated Matches"))
+
+    return {
+        "rank": int(rank_tag.text[:-2]) if rank_tag else None,
+        "rating": int(rating_tag.find_all_next("span")[0].text) if rating_tag else None,
+        "highest_rating": int(highest_tag.find_all_next("span")[0].text)
+        if highest_tag
+        else None,
+        "rated_matches": int(rated_label.parent.next_sibling.text) if rated_label else 0,
+        "last_competed": last_tag.text if last_tag else None,
+    }
+
+
+def bench(pages: list[str], number: int = 200) -> None:
+    # fetch_profile と同じ (非同期の) 解析処理を使う
+    loop = asyncio.new_event_loop()
+    for path in pages:
+        with open(path, "rb") as f:
+            content = f.read()
+
+        legacy = min(timeit.repeat(lambda: legacy_parse(content), number=number, repeat=3))
+        current = min(
+            timeit.repeat(
+                lambda: loop.run_until_complete(
+                    Atcoder._parse_profile(
+                        "bench", AsyncChunks(content, Atcoder.parse_chunk_size)
+                    )
+                ),
+                number=number,
+                repeat=3,
+            )
+        )
+
+        print(f"{path} ({len(content) / 1024:.1f} KiB)")
+        print(f"  legacy  (BeautifulSoup): {legacy / number * 1e3:8.3f} ms/page")
+        print(f"  current (table parser) : {current / number * 1e3:8.3f} ms/page")
+        print(f"  speedup                : {legacy / current:8.1f}x")
+    loop.close()
+
+
+if __name__ == "__main__":
+    bench(sys.argv[1:] or DEFAULT_PAGES)
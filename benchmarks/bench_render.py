@@ -0,0 +1,84 @@
+# カードの render 1回あたりの CPU 時間を、テンプレートを毎回作る場合 (cold) と
+# コンパイル済みテンプレートを使う場合 (warm) で比較する
+#
+#   python -m benchmarks.bench_render [number]
+import datetime
+import sys
+import timeit
+from typing import Callable
+
+from src.atcoder import UserData, Competition
+from src.cards.card import Card
+from src.cards.error import ErrorCard
+from src.cards.heatmap import HeatmapCard, HeatmapOption
+from src.cards.stats import StatsCard, StatsOption, _rating_keyframes
+from src.submission_table import SubmissionTable
+
+from benchmarks.bench_decode import make_submissions_json
+
+
+def make_userdata(history_rows: int = 10) -> UserData:
+    jst = datetime.timezone(datetime.timedelta(hours=9))
+    return UserData(
+        id="bench_user",
+        rank=1000,
+        rating=1450,
+        highest_rating=1600,
+        rated_matches=history_rows,
+        last_competed=datetime.datetime(2023, 4, 10),
+        competitions_history=[
+            Competition(
+                date=datetime.datetime(2020, 1, 1, 22, 40, tzinfo=jst)
+                + datetime.timedelta(weeks=i),
+                is_rated=True,
+                contest_jp=f"AtCoder Beginner Contest {100 + i}",
+                contest_en=f"AtCoder Beginner Contest {100 + i}",
+                rank=1000 + i,
+                performance=1200 + i % 800,
+                new_rating=1400,
+                old_rating=1390,
+            )
+            for i in range(history_rows)
+        ],
+    )
+
+
+def make_submission_table(n: int = 5_000) -> SubmissionTable:
+    import json
+
+    return SubmissionTable.from_rows(json.loads(make_submissions_json(n)))
+
+
+def cold(render: Callable[[], str]) -> Callable[[], str]:
+    def run() -> str:
+        Card.clear_templates()
+        _rating_keyframes.cache_clear()
+        return render()
+
+    return run
+
+
+def bench(number: int = 2_000) -> None:
+    userdata = make_userdata()
+    table = make_submission_table()
+    heatmap = HeatmapCard("bench_user", table, HeatmapOption())
+
+    cards = {
+        "stats": StatsCard(userdata, StatsOption()),
+        "stats (history)": StatsCard(userdata, StatsOption(show_history=10)),
+        "heatmap": heatmap,
+        "error": ErrorCard("User Name Not Found.", "Please make sure username is correct."),
+    }
+
+    for name, card in cards.items():
+        cold_time = min(timeit.repeat(cold(card.render), number=number, repeat=3))
+        warm_time = min(timeit.repeat(card.render, number=number, repeat=3))
+
+        print(f"{name} ({len(card.render()) / 1024:.1f} KiB)")
+        print(f"  cold (compile every time): {cold_time / number * 1e6:8.1f} us/render")
+        print(f"  warm (cached template)   : {warm_time / number * 1e6:8.1f} us/render")
+        print(f"  saved                    : {(cold_time - warm_time) / number * 1e6:8.1f} us/render")
+
+
+if __name__ == "__main__":
+    bench(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,170 @@
+# FastAPI アプリに同時に複数のリクエストを送り、レイテンシ (p50/p95/p99) とスループットを測る
+#
+#   # 代替サーバーとアプリを起動してから
+#   python -m benchmarks.upstream_server --port 8001 --latency 50 &
+#   ATCODER_README_STATS_ATCODER_BASE_URL=http://127.0.0.1:8001 \
+#   ATCODER_README_STATS_ATCODER_PROBLEMS_BASE_URL=http://127.0.0.1:8001 \
+#       uvicorn api.router:app --port 8000 &
+#   python -m benchmarks.loadgen --url http://127.0.0.1:8000 --concurrency 1,10,50
+#
+# --url を省略するとアプリをこのプロセス内で (ASGI で直接) 呼び出す
+#
+# 前のレベルで温まったキャッシュを次のレベルで測らないように、レベルごと (実行ごと) に
+# 別のユーザー名を使う (cold)。--warm を付けると全レベルで同じユーザーを使う
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import List, Optional
+
+import httpx
+from pydantic import BaseModel
+
+DEFAULT_PATHS = ["/stats/{user}", "/stats/{user}?show_history=5", "/heatmap/{user}"]
+
+
+class LoadResult(BaseModel):
+    concurrency: int
+    # cold: 前のレベルと別のユーザー / warm: 前のレベルと同じユーザー
+    cache: str
+    requests: int
+    errors: int
+    elapsed: float
+    latencies: List[float]
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p: float) -> float:
+        # 最近傍法
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, max(0, round(p / 100 * len(latencies)) - 1))
+        return latencies[index]
+
+
+def make_paths(
+    paths: List[str], users: int, requests: int, seed: int = 0, prefix: str = "user"
+) -> List[str]:
+    # users 人の中からランダムに選ぶ (人数を減らすとキャッシュに当たりやすくなる)
+    # 代替サーバーは "_数字" で終わる名前を提出数の指定とみなすので、prefix に "_" は使わない
+    rng = random.Random(seed)
+    return [
+        rng.choice(paths).format(user=f"{prefix}{rng.randrange(users)}")
+        for _ in range(requests)
+    ]
+
+
+async def run_load(
+    client: httpx.AsyncClient, paths: List[str], concurrency: int, cache: str = "cold"
+) -> LoadResult:
+    queue: "asyncio.Queue[str]" = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while not queue.empty():
+            path = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                res = await client.get(path)
+                # エラーカード (no-store) も失敗として数える
+                if res.status_code >= 400 or "no-store" in res.headers.get("cache-control", ""):
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return LoadResult(
+        concurrency=concurrency,
+        cache=cache,
+        requests=len(paths),
+        errors=errors,
+        elapsed=elapsed,
+        latencies=latencies,
+    )
+
+
+def make_client(url: Optional[str], timeout: float) -> httpx.AsyncClient:
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout)
+
+    from api.router import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=timeout
+    )
+
+
+def report(result: LoadResult) -> None:
+    print(
+        f"{result.concurrency:>11} {result.cache:>5} {result.requests:>8} {result.errors:>6}"
+        f" {result.throughput:>9.1f}"
+        f" {result.percentile(50) * 1e3:>9.1f} {result.percentile(95) * 1e3:>9.1f}"
+        f" {result.percentile(99) * 1e3:>9.1f}"
+    )
+
+
+def user_prefix(run_id: str, level: int, warm: bool) -> str:
+    # 実行ごとに run_id を変えるので、前回の実行で温まったサーバーに対しても cold になる
+    return f"r{run_id}user" if warm else f"r{run_id}l{level}user"
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    run_id = os.urandom(3).hex()
+
+    print(
+        f"{'concurrency':>11} {'cache':>5} {'requests':>8} {'errors':>6}"
+        f" {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    async with make_client(args.url, args.timeout) as client:
+        for level, concurrency in enumerate(args.concurrency):
+            prefix = user_prefix(run_id, level, args.warm)
+            paths = make_paths(args.paths, args.users, args.requests, args.seed, prefix)
+            cache = "warm" if args.warm and level > 0 else "cold"
+            result = await run_load(client, paths, concurrency, cache)
+            report(result)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="load generator for the card API")
+    parser.add_argument("--url", help="base URL of the app (default: call the app in-process)")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda s: [int(c) for c in s.split(",")],
+        default=[1, 10, 50],
+        help="comma separated concurrency levels (default: 1,10,50)",
+    )
+    parser.add_argument("--requests", type=int, default=500, help="requests per level")
+    parser.add_argument("--users", type=int, default=50, help="number of distinct users")
+    parser.add_argument(
+        "--paths",
+        nargs="+",
+        default=DEFAULT_PATHS,
+        help="path templates, {user} is replaced by a username",
+    )
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="reuse the same users at every level (later levels hit the caches)",
+    )
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# カードの種類ごとに、テンプレートのままの出力と minify した出力のサイズを比べる
+#
+#   python -m benchmarks.report_svg_size
+import gzip
+
+from src.cards.error import ErrorCard
+from src.cards.heatmap import HeatmapCard, HeatmapOption
+from src.cards.stats import StatsCard, StatsOption
+
+from benchmarks.bench_render import make_userdata, make_submission_table
+
+
+def report() -> None:
+    userdata = make_userdata()
+    table = make_submission_table()
+
+    cards = {
+        "stats": StatsCard(userdata, StatsOption()),
+        "stats (history, icons)": StatsCard(
+            userdata, StatsOption(show_history=10, show_icons=True)
+        ),
+        "heatmap": HeatmapCard("bench_user", table, HeatmapOption()),
+        "heatmap (unique_ac)": HeatmapCard(
+            "bench_user", table, HeatmapOption(type="unique_ac")
+        ),
+        "error": ErrorCard("User Name Not Found.", "Please make sure username is correct."),
+    }
+
+    print(f"{'card':<24}{'pretty':>10}{'minified':>10}{'ratio':>8}{'pretty.gz':>11}{'min.gz':>9}")
+    for name, card in cards.items():
+        pretty = card.render().encode()
+        minified = card.render(minify=True).encode()
+        print(
+            f"{name:<24}{len(pretty):>10}{len(minified):>10}"
+            f"{len(minified) / len(pretty):>8.2f}"
+            f"{len(gzip.compress(pretty)):>11}{len(gzip.compress(minified)):>9}"
+        )
+
+
+if __name__ == "__main__":
+    report()
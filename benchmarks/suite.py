@@ -0,0 +1,267 @@
+# 上流に接続せずに、取得・解析・検証・描画の速度をまとめて計測する
+# 結果をベースラインとして保存し、次回以降は閾値を超えて遅くなったケースを報告する
+#
+#   python -m benchmarks.suite                  # 計測してベースラインと比較
+#   python -m benchmarks.suite --save           # 計測結果をベースラインとして保存
+#   python -m benchmarks.suite -k heatmap       # 名前に heatmap を含むケースだけ
+#   python -m benchmarks.suite --threshold 0.1  # 10% 以上遅くなったら失敗
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+from typing import Callable, Iterator, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from src.atcoder import Atcoder, COMPETITIONS_ADAPTER, UserData
+from src.atcoder_problems import AtcoderProblems
+from src.cards.heatmap import HeatmapCard, HeatmapOption
+from src.cards.stats import StatsCard, StatsOption
+from src.client import UpstreamClient
+from src.submission_store import StoredSubmissions
+from src.submission_table import SubmissionTable
+
+from benchmarks.bench_decode import make_history_json, make_submissions_json
+from tests.utils import AsyncChunks
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+
+PROFILE_PAGE = "tests/html/profile.html"
+SUBMISSION_ROWS = [1_000, 50_000, 500_000]
+HEATMAP_ROWS = 20_000
+HISTORY_ROWS = 1_000
+
+# 1ケースあたりの計測回数 (最小値を使う)
+REPEAT = 3
+# 1回の計測でこれだけの時間は回す
+MIN_TIME = 0.2
+
+Case = Callable[[], object]
+# 計測対象を作る関数 (選ばれたケースだけデータを用意する)
+Setup = Callable[[], Case]
+
+
+class SubmissionPages:
+    # submissions API と同じく from_second 以降を 500 件ずつ返す
+    # JSON はあらかじめページごとに作っておき、計測には含めない
+    def __init__(self, n: int) -> None:
+        rows = json.loads(make_submissions_json(n))
+        self.pages: dict[int, bytes] = {}
+        for i in range(0, n + 1, 500):
+            page = rows[i : i + 500]
+            from_second = rows[i - 1]["epoch_second"] + 1 if i else 0
+            self.pages[from_second] = json.dumps(page).encode()
+
+    async def get(self, url: str) -> httpx.Response:
+        from_second = int(parse_qs(urlsplit(url).query)["from_second"][0])
+        return httpx.Response(200, content=self.pages[from_second])
+
+
+def read_profile_page() -> bytes:
+    with open(PROFILE_PAGE, "rb") as f:
+        return f.read()
+
+
+def profile_parse(loop: asyncio.AbstractEventLoop) -> Case:
+    # fetch_profile と同じ解析処理 (チャンクごとに読み、テーブルを読み終えたら止める)
+    content = read_profile_page()
+    return lambda: loop.run_until_complete(
+        Atcoder._parse_profile("bench_user", AsyncChunks(content, Atcoder.parse_chunk_size))
+    )
+
+
+def profile_fetch(loop: asyncio.AbstractEventLoop) -> Case:
+    # ストリーミング取得を含めた fetch_profile (通信はトランスポートで差し替える)
+    content = read_profile_page()
+
+    def fetch() -> object:
+        UpstreamClient.transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, content=content)
+        )
+        try:
+            return loop.run_until_complete(Atcoder.fetch_profile("bench_user"))
+        finally:
+            UpstreamClient.transport = None
+
+    return fetch
+
+
+def history_decode() -> Case:
+    content = make_history_json(HISTORY_ROWS)
+    return lambda: COMPETITIONS_ADAPTER.validate_json(content)
+
+
+def submissions_decode(loop: asyncio.AbstractEventLoop, n: int) -> Case:
+    pages = SubmissionPages(n)
+
+    # fetch_submissions の初回取得と同じく、ページごとに検証してテーブルにまとめる
+    def decode() -> object:
+        original = AtcoderProblems._request
+        AtcoderProblems._request = pages.get
+        try:
+            rows = loop.run_until_complete(
+                AtcoderProblems._fetch_submission_rows("bench_user", 0)
+            )
+        finally:
+            AtcoderProblems._request = original
+        stored = StoredSubmissions(user_id="bench_user")
+        stored.merge(rows)
+        return stored
+
+    return decode
+
+
+def heatmap_table() -> SubmissionTable:
+    # 表示期間 (24週) に収まるように、直近の提出を作る
+    interval = 600
+    start_second = int(time.time()) - HEATMAP_ROWS * interval
+    rows = json.loads(make_submissions_json(HEATMAP_ROWS, start_second, interval))
+    return SubmissionTable.from_rows(rows)
+
+
+def heatmap_build(type_: str) -> Case:
+    table, option = heatmap_table(), HeatmapOption(type=type_)
+    return lambda: HeatmapCard("bench_user", table, option)
+
+
+def heatmap_render(type_: str) -> Case:
+    return HeatmapCard("bench_user", heatmap_table(), HeatmapOption(type=type_)).render
+
+
+def stats_render(show_history: int) -> Case:
+    history = COMPETITIONS_ADAPTER.validate_json(make_history_json(HISTORY_ROWS))
+    userdata = UserData(
+        id="bench_user",
+        rank=1000,
+        rating=1450,
+        highest_rating=1600,
+        rated_matches=len(history),
+        last_competed=datetime.datetime(2023, 4, 10),
+        competitions_history=history,
+    )
+    return StatsCard(userdata, StatsOption(show_history=show_history)).render
+
+
+def cases(loop: asyncio.AbstractEventLoop) -> Iterator[tuple[str, Setup]]:
+    yield "profile.parse", lambda: profile_parse(loop)
+    yield "profile.fetch", lambda: profile_fetch(loop)
+    yield f"history.decode.{HISTORY_ROWS}", history_decode
+    for n in SUBMISSION_ROWS:
+        yield f"submissions.decode.{n // 1000}k", lambda n=n: submissions_decode(loop, n)
+    for type_ in ["all", "ac", "unique_ac"]:
+        yield f"heatmap.build.{type_}", lambda type_=type_: heatmap_build(type_)
+        yield f"heatmap.render.{type_}", lambda type_=type_: heatmap_render(type_)
+    for show_history in [3, 50]:
+        yield f"stats.render.history{show_history}", lambda n=show_history: stats_render(n)
+
+
+def measure(case: Case, repeat: int = REPEAT) -> float:
+    # 1回あたりの秒数 (repeat 回のうち最小)
+    timer = timeit.Timer(case)
+    number, elapsed = timer.autorange()
+    if elapsed < MIN_TIME:
+        number = max(number, int(number * MIN_TIME / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def load_baseline(path: str) -> dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(path: str, results: dict[str, float]) -> None:
+    # 既存のケースは上書きし、今回計測していないケースは残す
+    merged = {**load_baseline(path), **results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": merged,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+        f.write("\n")
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:8.3f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.3f} ms"
+    return f"{seconds * 1e6:8.1f} us"
+
+
+def run(
+    keyword: Optional[str] = None,
+    baseline_path: str = DEFAULT_BASELINE,
+    threshold: float = DEFAULT_THRESHOLD,
+    save: bool = False,
+) -> int:
+    baseline = load_baseline(baseline_path)
+    results: dict[str, float] = {}
+    regressions: list[str] = []
+
+    loop = asyncio.new_event_loop()
+    try:
+        for name, setup in cases(loop):
+            if keyword and keyword not in name:
+                continue
+
+            seconds = measure(setup())
+            results[name] = seconds
+
+            line = f"{name:<28}{format_time(seconds)}"
+            if name in baseline:
+                ratio = seconds / baseline[name]
+                line += f"   baseline {format_time(baseline[name])}   {ratio:5.2f}x"
+                if ratio > 1 + threshold:
+                    line += "   REGRESSION"
+                    regressions.append(name)
+            print(line, flush=True)
+    finally:
+        loop.run_until_complete(UpstreamClient.aclose())
+        loop.close()
+
+    if save:
+        save_baseline(baseline_path, results)
+        print(f"saved baseline to {baseline_path}")
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than baseline by more than {threshold:.0%}:")
+        for name in regressions:
+            print(f"  {name}")
+        return 1
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="offline benchmark suite")
+    parser.add_argument("-k", "--keyword", help="run only cases whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON path")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed slowdown ratio before a case is flagged (default: 0.25)",
+    )
+    parser.add_argument("--save", action="store_true", help="save results as the baseline")
+    args = parser.parse_args(argv)
+
+    return run(args.keyword, args.baseline, args.threshold, args.save)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
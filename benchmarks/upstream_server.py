@@ -0,0 +1,152 @@
+# 負荷試験用に atcoder.jp / kenkoooo.com の代わりをするローカルサーバー
+# プロフィール HTML・コンテスト履歴・提出 API (500件ずつ) をフィクスチャと合成データで返す
+#
+#   python -m benchmarks.upstream_server --port 8001 --latency 50 --error-rate 0.01
+#
+# アプリ側は次の環境変数でこのサーバーに向ける
+#   ATCODER_README_STATS_ATCODER_BASE_URL=http://127.0.0.1:8001
+#   ATCODER_README_STATS_ATCODER_PROBLEMS_BASE_URL=http://127.0.0.1:8001
+#
+# ユーザー名の末尾の数字で提出数を変えられる (ex: heavy_50000 は 5万件)
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import re
+import time
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import FastAPI, Query
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from benchmarks.bench_decode import make_history_json, make_submissions_json
+
+PROFILE_PAGE = "tests/html/profile.html"
+PROFILE_USER = "iwbc_mzk"
+PAGE_SIZE = 500
+
+USER_SIZE_PATTERN = re.compile(r".*_(\d+)")
+
+
+class Settings(BaseModel):
+    # 1リクエストあたりの遅延 (ms) と、そのばらつき (ms)
+    latency: float = float(os.environ.get("STANDIN_LATENCY_MS", 0))
+    jitter: float = float(os.environ.get("STANDIN_JITTER_MS", 0))
+    # 503 を返す割合
+    error_rate: float = float(os.environ.get("STANDIN_ERROR_RATE", 0))
+    # ユーザー名で指定がない場合の提出数・コンテスト数
+    submissions: int = int(os.environ.get("STANDIN_SUBMISSIONS", 2_000))
+    history: int = int(os.environ.get("STANDIN_HISTORY", 50))
+    # 提出の間隔 (秒)。直近に寄せるとヒートマップの期間に多く入る
+    submission_interval: int = int(os.environ.get("STANDIN_SUBMISSION_INTERVAL", 3_600))
+
+
+settings = Settings()
+app = FastAPI()
+
+
+@lru_cache(maxsize=1)
+def profile_page() -> str:
+    with open(PROFILE_PAGE, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def submission_count(username: str) -> int:
+    m = USER_SIZE_PATTERN.fullmatch(username)
+    return int(m.group(1)) if m else settings.submissions
+
+
+@lru_cache(maxsize=256)
+def user_submissions(username: str, n: int) -> tuple[list[int], list[dict]]:
+    # 最後の提出が現在時刻になるように並べる
+    interval = settings.submission_interval
+    start_second = int(time.time()) - n * interval
+    rows = json.loads(make_submissions_json(n, start_second, interval))
+    for row in rows:
+        row["user_id"] = username
+    return [row["epoch_second"] for row in rows], rows
+
+
+@lru_cache(maxsize=256)
+def user_history(username: str, n: int) -> bytes:
+    return make_history_json(n)
+
+
+async def simulate() -> Optional[Response]:
+    delay = settings.latency + random.uniform(-settings.jitter, settings.jitter)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+    if random.random() < settings.error_rate:
+        return Response(status_code=503, content="Service Unavailable")
+    return None
+
+
+@app.get("/users/{username}")
+async def profile(username: str):
+    if error := await simulate():
+        return error
+    return Response(
+        content=profile_page().replace(PROFILE_USER, username),
+        media_type="text/html; charset=utf-8",
+    )
+
+
+@app.get("/users/{username}/history/json")
+async def history(username: str):
+    if error := await simulate():
+        return error
+    return Response(
+        content=user_history(username, settings.history), media_type="application/json"
+    )
+
+
+@app.get("/atcoder-api/v3/user/submissions")
+async def submissions(user: str, from_second: int = Query(default=0)):
+    if error := await simulate():
+        return error
+    epochs, rows = user_submissions(user, submission_count(user))
+    start = bisect.bisect_left(epochs, from_second)
+    return Response(
+        content=json.dumps(rows[start : start + PAGE_SIZE]), media_type="application/json"
+    )
+
+
+@app.get("/resources/problem-models.json")
+async def problem_models():
+    if error := await simulate():
+        return error
+    models = {
+        f"abc{100 + i}_{c}": {"difficulty": 100 * j + i, "is_experimental": False}
+        for i in range(250)
+        for j, c in enumerate("abcdefg")
+    }
+    return Response(content=json.dumps(models), media_type="application/json")
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="local upstream stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=settings.latency, help="ms")
+    parser.add_argument("--jitter", type=float, default=settings.jitter, help="ms")
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate)
+    parser.add_argument("--submissions", type=int, default=settings.submissions)
+    parser.add_argument("--history", type=int, default=settings.history)
+    parser.add_argument(
+        "--submission-interval", type=int, default=settings.submission_interval, help="s"
+    )
+    args = parser.parse_args()
+
+    for name in Settings.model_fields:
+        setattr(settings, name, getattr(args, name))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
-import re
-import json
+import codecs
+import asyncio
 from datetime import datetime
 from urllib.parse import urljoin
-from typing import Optional, List
+from html.parser import HTMLParser
+from typing import Optional, List, AsyncIterable
 
-from bs4 import BeautifulSoup
-import requests
-from pydantic import BaseModel
+import httpx
+from pydantic import BaseModel, Field, AliasChoices, TypeAdapter
+
+from src.client import UpstreamClient, run_sync
+from src.cache import SingleFlight
+from src.config import ATCODER_BASE_URL
+from src.timing import timed, phase
 
 
 class Profile(BaseModel):
@@ -18,15 +23,27 @@ class Profile(BaseModel):
     last_competed: Optional[datetime] = None
 
 
+# /history/json のキー名でも検証できるようにする
 class Competition(BaseModel):
-    date: datetime
-    is_rated: bool
-    contest_jp: str
-    contest_en: Optional[str]
-    rank: Optional[int]
-    performance: Optional[int]
-    old_rating: Optional[int]
-    new_rating: Optional[int]
+    date: datetime = Field(validation_alias=AliasChoices("date", "EndTime"))
+    is_rated: bool = Field(validation_alias=AliasChoices("is_rated", "IsRated"))
+    contest_jp: str = Field(validation_alias=AliasChoices("contest_jp", "ContestName"))
+    contest_en: Optional[str] = Field(
+        validation_alias=AliasChoices("contest_en", "ContestNameEn")
+    )
+    rank: Optional[int] = Field(validation_alias=AliasChoices("rank", "Place"))
+    performance: Optional[int] = Field(
+        validation_alias=AliasChoices("performance", "Performance")
+    )
+    old_rating: Optional[int] = Field(
+        validation_alias=AliasChoices("old_rating", "OldRating")
+    )
+    new_rating: Optional[int] = Field(
+        validation_alias=AliasChoices("new_rating", "NewRating")
+    )
+
+
+COMPETITIONS_ADAPTER = TypeAdapter(List[Competition])
 
 
 class UserData(BaseModel):
@@ -40,70 +57,129 @@ class UserData(BaseModel):
 
 
 class Atcoder:
-    base_url = "https://atcoder.jp/users/"
+    base_url = f"{ATCODER_BASE_URL}/users/"
+    parse_chunk_size = 4096
+    _flight = SingleFlight()
 
     @classmethod
-    def fetch_userdata(cls, username: str, need_compe: bool = False) -> UserData:
+    async def fetch_userdata(
+        cls, username: str, need_compe: bool = False, need_rank: bool = True
+    ) -> UserData:
         userdata = UserData(id=username)
 
-        profile = cls.fetch_profile(username)
-        cls._set_profile(userdata, profile)
+        if not need_rank:
+            # 順位以外の項目はコンテスト履歴(JSON)から計算できるので HTML は取得しない
+            try:
+                histories = await cls.fetch_competition_histry(username)
+            except ValueError:
+                raise ValueError(
+                    "User Name Not Found.", "Please make sure username is correct."
+                )
+            profile = cls._profile_from_history(username, histories)
+            if need_compe:
+                userdata.competitions_history = histories
+        elif need_compe:
+            # プロフィールとコンテスト履歴は同時に取得する
+            # 片方が失敗したらもう片方は待たない (両方失敗していればプロフィール側の例外を投げる)
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    profile_task = tg.create_task(cls.fetch_profile(username))
+                    history_task = tg.create_task(cls.fetch_competition_histry(username))
+            except BaseExceptionGroup as eg:
+                for task in (profile_task, history_task):
+                    if not task.cancelled() and (e := task.exception()) is not None:
+                        raise e from None
+                raise eg.exceptions[0] from None
+            profile = profile_task.result()
+            userdata.competitions_history = history_task.result()
+        else:
+            profile = await cls.fetch_profile(username)
 
-        if need_compe:
-            userdata.competitions_history = cls.fetch_competition_histry(username)
+        cls._set_profile(userdata, profile)
 
         return userdata
 
     @classmethod
-    def fetch_profile(cls, username: str) -> Profile:
+    def fetch_userdata_sync(
+        cls, username: str, need_compe: bool = False, need_rank: bool = True
+    ) -> UserData:
+        return run_sync(cls.fetch_userdata(username, need_compe, need_rank))
+
+    @classmethod
+    @timed("profile")
+    async def fetch_profile(cls, username: str) -> Profile:
+        # 同じユーザーへの同時リクエストは1回の取得にまとめる
+        return await cls._flight.do(
+            ("profile", username), lambda: cls._fetch_profile(username)
+        )
+
+    @classmethod
+    async def _fetch_profile(cls, username: str) -> Profile:
         url = cls._get_profile_url(username)
         profile = Profile(id=username)
 
-        res = cls._request(url)
-        if res.ok:
-            soup = BeautifulSoup(res.content, "html.parser")
-            profile = Profile(
-                **{  # type: ignore
-                    "id": username,
-                    "rank": cls._search_rank(soup),
-                    "rating": cls._search_rating(soup),
-                    "highest_rating": cls._search_highest_rating(soup),
-                    "rated_matches": cls._search_rated_matches(soup),
-                    "last_competed": cls._search_last_competed(soup),
-                }
-            )
-        else:
-            raise ValueError(
-                "User Name Not Found.", "Please make sure username is correct."
-            )
+        # プロフィールのテーブルを読み終えた時点でダウンロードを打ち切る
+        async with UpstreamClient.stream(url) as res:
+            if res.is_success:
+                profile = await cls._parse_profile(
+                    username, res.aiter_bytes(cls.parse_chunk_size)
+                )
+            else:
+                raise ValueError(
+                    "User Name Not Found.", "Please make sure username is correct."
+                )
 
         return profile
 
     @classmethod
-    def fetch_competition_histry(cls, username: str) -> List[Competition]:
+    def fetch_profile_sync(cls, username: str) -> Profile:
+        return run_sync(cls.fetch_profile(username))
+
+    @classmethod
+    @timed("history")
+    async def fetch_competition_histry(cls, username: str) -> List[Competition]:
+        return await cls._flight.do(
+            ("history", username), lambda: cls._fetch_competition_histry(username)
+        )
+
+    @classmethod
+    async def _fetch_competition_histry(cls, username: str) -> List[Competition]:
         url = cls._get_competition_history_url(username)
         histries = []
 
-        res = cls._request(url)
-        if res.ok:
-            contests = json.loads(res.content)
-            for contest in contests:
-                competition = Competition(
-                    date=datetime.strptime(contest["EndTime"], "%Y-%m-%dT%H:%M:%S%z"),
-                    contest_jp=contest["ContestName"],
-                    contest_en=contest["ContestNameEn"],
-                    is_rated=contest["IsRated"],
-                    rank=contest["Place"],
-                    performance=contest["Performance"],
-                    old_rating=contest["OldRating"],
-                    new_rating=contest["NewRating"],
-                )
-                histries.append(competition)
+        res = await cls._request(url)
+        if res.is_success:
+            # JSON のパースと検証をまとめて行う
+            with phase("history_decode"):
+                histries = COMPETITIONS_ADAPTER.validate_json(res.content)
         else:
             raise ValueError("User Name Not Found.", "")
 
         return histries
 
+    @classmethod
+    def fetch_competition_histry_sync(cls, username: str) -> List[Competition]:
+        return run_sync(cls.fetch_competition_histry(username))
+
+    @classmethod
+    def _profile_from_history(
+        cls, username: str, histories: List[Competition]
+    ) -> Profile:
+        rated = sorted((c for c in histories if c.is_rated), key=lambda x: x.date)
+        if not rated:
+            return Profile(id=username, rated_matches=0)
+
+        ratings = [c.new_rating for c in rated if c.new_rating is not None]
+        last = rated[-1].date
+        return Profile(
+            id=username,
+            rating=rated[-1].new_rating,
+            highest_rating=max(ratings) if ratings else None,
+            rated_matches=len(rated),
+            # プロフィールページと同じく日付のみ (日本時間)
+            last_competed=datetime(last.year, last.month, last.day),
+        )
+
     @classmethod
     def _set_profile(cls, userdata: UserData, profile: Profile):
         userdata.rank = profile.rank
@@ -121,68 +197,125 @@ class Atcoder:
         return urljoin(cls.base_url, f"{username}/history/json")
 
     @classmethod
-    def _request(cls, url: str) -> requests.Response:
-        return requests.get(url)
+    async def _request(cls, url: str) -> httpx.Response:
+        return await UpstreamClient.get(url)
 
     @classmethod
-    def _search_rank(cls, soup: BeautifulSoup) -> Optional[int]:
+    async def _parse_profile(cls, username: str, chunks: AsyncIterable[bytes]) -> Profile:
+        parser = ProfileTableParser()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # テーブルを読み終えたら残り (スクリプトやフッター) は読まない
+        async for chunk in chunks:
+            with phase("profile_parse"):
+                parser.feed(decoder.decode(chunk))
+            if parser.done:
+                break
+
+        return cls._profile_from_table(username, parser.table)
+
+    @classmethod
+    def _profile_from_table(cls, username: str, table: dict[str, List[str]]) -> Profile:
+        return Profile(
+            **{  # type: ignore
+                "id": username,
+                "rank": cls._search_rank(table),
+                "rating": cls._search_rating(table),
+                "highest_rating": cls._search_highest_rating(table),
+                "rated_matches": cls._search_rated_matches(table),
+                "last_competed": cls._search_last_competed(table),
+            }
+        )
+
+    @classmethod
+    def _search_rank(cls, table: dict[str, List[str]]) -> Optional[int]:
         rank = None
-        rank_label_tag = soup.find("th", string="Rank")
-        if rank_label_tag:
-            rank_val_tag = rank_label_tag.next_sibling
-            if rank_val_tag:
-                rank = int(rank_val_tag.text[:-2])
+        rank_val = table.get("Rank")
+        if rank_val:
+            rank = int(rank_val[0][:-2])
 
         return rank
 
     @classmethod
-    def _search_rating(cls, soup: BeautifulSoup) -> Optional[int]:
+    def _search_rating(cls, table: dict[str, List[str]]) -> Optional[int]:
         rating = None
-        rating_label_tag = soup.find("th", string="Rating")
-        if rating_label_tag:
-            rating_val_tag = rating_label_tag.next_sibling
-            if rating_val_tag:
-                rating_tag = rating_val_tag.find_all_next("span")
-                if rating_tag:
-                    rating = int(rating_tag[0].text)
+        rating_val = table.get("Rating")
+        if rating_val:
+            rating = int(rating_val[0])
 
         return rating
 
     @classmethod
-    def _search_highest_rating(cls, soup: BeautifulSoup) -> Optional[int]:
+    def _search_highest_rating(cls, table: dict[str, List[str]]) -> Optional[int]:
         highest_rating = None
-        highest_rating_label_tag = soup.find("th", string="Highest Rating")
-        if highest_rating_label_tag:
-            highest_rating_val_tag = highest_rating_label_tag.next_sibling
-            if highest_rating_val_tag:
-                highest_rating_tags = highest_rating_val_tag.find_all_next("span")
-                if highest_rating_tags:
-                    highest_rating = int(highest_rating_tags[0].text)
+        highest_rating_val = table.get("Highest Rating")
+        if highest_rating_val:
+            highest_rating = int(highest_rating_val[0])
 
         return highest_rating
 
     @classmethod
-    def _search_rated_matches(cls, soup: BeautifulSoup) -> Optional[int]:
+    def _search_rated_matches(cls, table: dict[str, List[str]]) -> Optional[int]:
         rated_matches = 0
-        rated_matches_label = soup.find(string=re.compile("Rated Matches"))
-        if rated_matches_label:
-            rated_matches_label_tag = rated_matches_label.parent
-            if rated_matches_label_tag:
-                rated_matches_val_tag = rated_matches_label_tag.next_sibling
-                if rated_matches_val_tag:
-                    rated_matches = int(rated_matches_val_tag.text)
+        rated_matches_val = table.get("Rated Matches")
+        if rated_matches_val:
+            rated_matches = int(rated_matches_val[0])
 
         return rated_matches
 
     @classmethod
-    def _search_last_competed(cls, soup: BeautifulSoup) -> Optional[datetime]:
+    def _search_last_competed(cls, table: dict[str, List[str]]) -> Optional[datetime]:
         last_competed = None
-        last_competed_label_tag = soup.find("th", string="Last Competed")
-        if last_competed_label_tag:
-            last_competed_val_tag = last_competed_label_tag.next_sibling
-            if last_competed_val_tag:
-                last_competed = datetime.strptime(
-                    last_competed_val_tag.text, "%Y/%m/%d"
-                )
+        last_competed_val = table.get("Last Competed")
+        if last_competed_val:
+            last_competed = datetime.strptime(last_competed_val[0], "%Y/%m/%d")
 
         return last_competed
+
+
+# プロフィールページの <table class="dl-table"> だけを読み、
+# 見出し(th) -> 値(td 内のテキスト) の対応表を一度の走査で作る
+class ProfileTableParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.table: dict[str, List[str]] = {}
+        # Rank 等を含むテーブルを閉じたら以降は読む必要がない
+        self.done = False
+
+        self._in_table = False
+        self._cell: Optional[str] = None
+        self._label: Optional[str] = None
+        self._texts: List[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        if self.done:
+            return
+
+        if tag == "table":
+            classes = (dict(attrs).get("class") or "").split()
+            self._in_table = "dl-table" in classes
+        elif self._in_table and tag in ("th", "td"):
+            self._cell = tag
+            self._texts = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.done or not self._in_table:
+            return
+
+        if tag == "th" and self._cell == "th":
+            self._label = " ".join(self._texts)
+            self._cell = None
+        elif tag == "td" and self._cell == "td":
+            if self._label is not None:
+                self.table[self._label] = self._texts
+            self._label = None
+            self._cell = None
+        elif tag == "table":
+            self._in_table = False
+            if "Rank" in self.table:
+                self.done = True
+
+    def handle_data(self, data: str) -> None:
+        if self._cell is not None:
+            text = data.strip()
+            if text:
+                self._texts.append(text)
@@ -1,11 +1,16 @@
-from typing import Optional, List
-import json
-import datetime
-import pickle
+from typing import Optional, List, Sequence, Union
 
-import requests
+import httpx
+from pydantic import BaseModel, TypeAdapter
 
-from pydantic import BaseModel
+from src.client import UpstreamClient, run_sync
+from src.config import ATCODER_PROBLEMS_BASE_URL
+from src.cache import SingleFlight
+from src.timing import timed, phase
+from src.metrics import SUBMISSION_PAGES
+from src.problem_model_store import ProblemModelStore, ProblemDifficulties
+from src.submission_store import SubmissionStore, StoredSubmissions
+from src.submission_table import SubmissionTable, SubmissionRow
 
 
 class Submission(BaseModel):
@@ -21,6 +26,9 @@ class Submission(BaseModel):
     execution_time: int | None
 
 
+SUBMISSIONS_ADAPTER = TypeAdapter(List[Submission])
+
+
 class ProblemModel(BaseModel):
     slope: float = 0.0
     intercept: float = 0.0
@@ -32,43 +40,117 @@ class ProblemModel(BaseModel):
     is_experimental: bool = False
 
 
+PROBLEM_MODELS_ADAPTER = TypeAdapter(dict[str, ProblemModel])
+
+
 class AtcoderProblems:
+    base_url = ATCODER_PROBLEMS_BASE_URL
+    _flight = SingleFlight()
+
+    @classmethod
+    async def fetch_submissions(
+        cls, user_id: str, from_unix_second: Optional[int] = 0, trusted: bool = False
+    ) -> Sequence[Union[Submission, SubmissionRow]]:
+        table = await cls.fetch_submission_table(user_id, from_unix_second)
+        # 保存済みの行は取得時に検証済みなので、trusted ならモデルを作らず行ビューを返す
+        if trusted:
+            return list(table)
+        return SUBMISSIONS_ADAPTER.validate_python(table.to_dicts())
+
     @classmethod
-    def fetch_submissions(
+    @timed("submissions")
+    async def fetch_submission_table(
         cls, user_id: str, from_unix_second: Optional[int] = 0
+    ) -> SubmissionTable:
+        from_unix_second = from_unix_second or 0
+
+        # 同じユーザーへの同時リクエストは1回の取得にまとめる
+        return await cls._flight.do(
+            ("submissions", user_id, from_unix_second),
+            lambda: cls._fetch_submission_table(user_id, from_unix_second),
+        )
+
+    @classmethod
+    async def _fetch_submission_table(
+        cls, user_id: str, from_unix_second: int
+    ) -> SubmissionTable:
+        # 保存済みの提出があれば差分だけ取得する
+        stored = SubmissionStore.load(user_id)
+        if stored is not None and stored.from_second <= from_unix_second:
+            rows = await cls._fetch_submission_rows(user_id, stored.resume_second())
+        else:
+            stored = StoredSubmissions(user_id=user_id, from_second=from_unix_second)
+            rows = await cls._fetch_submission_rows(user_id, from_unix_second)
+        stored.merge(rows)
+        SubmissionStore.save(stored)
+
+        # epoch_second 順なので期間外の提出は読み飛ばす
+        return stored.table.since(from_unix_second)
+
+    @classmethod
+    async def _fetch_submission_rows(
+        cls, user_id: str, from_unix_second: int
     ) -> List[Submission]:
-        url = f"https://kenkoooo.com/atcoder/atcoder-api/v3/user/submissions?user={user_id}&from_second={from_unix_second}"
+        url = cls._get_submissions_url(user_id, from_unix_second)
 
-        submissions: List[Submission] = []
+        rows: List[Submission] = []
+        pages = 0
 
         # API側の制限のため500件ずつ取得する
         while True:
-            res = requests.get(url)
-            if res.ok:
-                contents = json.loads(res.content)
-                submissions += sorted(
-                    [Submission(**v) for v in contents], key=lambda x: x.epoch_second
-                )
+            res = await cls._request(url)
+            pages += 1
+            if res.is_success:
+                # JSON のパースと検証をページ単位でまとめて行う
+                with phase("submissions_decode"):
+                    contents = SUBMISSIONS_ADAPTER.validate_json(res.content)
+                rows += sorted(contents, key=lambda x: x.epoch_second)
 
                 if len(contents) < 500:
                     break
 
-                new_from = submissions[-1].epoch_second + 1
-                url = f"https://kenkoooo.com/atcoder/atcoder-api/v3/user/submissions?user={user_id}&from_second={new_from}"
+                new_from = rows[-1].epoch_second + 1
+                url = cls._get_submissions_url(user_id, new_from)
             else:
                 res.raise_for_status()
 
-        return submissions
+        SUBMISSION_PAGES.observe(pages)
+        return rows
 
     @classmethod
-    def fetch_problem_models(cls) -> dict[str, ProblemModel]:
-        url = "https://kenkoooo.com/atcoder/resources/problem-models.json"
-        res = requests.get(url)
-        if res.ok:
-            problems: dict = json.loads(res.content)
-            problems = {id: ProblemModel(*problem) for id, problem in problems.items()}
-            return problems
-        else:
-            res.raise_for_status()
+    def fetch_submissions_sync(
+        cls, user_id: str, from_unix_second: Optional[int] = 0, trusted: bool = False
+    ) -> Sequence[Union[Submission, SubmissionRow]]:
+        return run_sync(cls.fetch_submissions(user_id, from_unix_second, trusted))
 
-        return []
+    @classmethod
+    async def fetch_problem_models(cls) -> dict[str, ProblemModel]:
+        # ローカルコピーを再検証してから読む
+        problems = await ProblemModelStore.fetch_models()
+        return PROBLEM_MODELS_ADAPTER.validate_python(problems)
+
+    @classmethod
+    async def fetch_problem_difficulties(cls) -> ProblemDifficulties:
+        return await ProblemModelStore.fetch_difficulties()
+
+    @classmethod
+    def fetch_submission_table_sync(
+        cls, user_id: str, from_unix_second: Optional[int] = 0
+    ) -> SubmissionTable:
+        return run_sync(cls.fetch_submission_table(user_id, from_unix_second))
+
+    @classmethod
+    def fetch_problem_models_sync(cls) -> dict[str, ProblemModel]:
+        return run_sync(cls.fetch_problem_models())
+
+    @classmethod
+    def fetch_problem_difficulties_sync(cls) -> ProblemDifficulties:
+        return run_sync(cls.fetch_problem_difficulties())
+
+    @classmethod
+    def _get_submissions_url(cls, user_id: str, from_unix_second: int) -> str:
+        return f"{cls.base_url}/atcoder-api/v3/user/submissions?user={user_id}&from_second={from_unix_second}"
+
+    @classmethod
+    async def _request(cls, url: str) -> httpx.Response:
+        return await UpstreamClient.get(url)
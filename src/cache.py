@@ -0,0 +1,214 @@
+from typing import Optional, Hashable, Any, Callable, Awaitable, TypeVar
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(BaseModel):
+    # bytes か、len() でサイズが分かるもの (EncodedBody 等)
+    value: Any
+    expires_at: float
+
+
+# TTL 付きの LRU キャッシュ
+# 値の合計サイズ (len) が max_bytes を超えたら古いものから捨てる
+class LRUCache:
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if len(value) > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = CacheEntry(value=value, expires_at=expires_at)
+        self._size += len(value)
+
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._size,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._size -= len(entry.value)
+
+
+def cache_key(kind: str, username: str, option: BaseModel) -> tuple[str, str, str]:
+    # set 等の順序に依存しないようにオプションを正規化する
+    def normalize(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple, set, frozenset)):
+            items = [normalize(v) for v in value]
+            return sorted(items, key=repr) if isinstance(value, (set, frozenset)) else items
+        return value
+
+    dumped = normalize(option.model_dump())
+    return kind, username, json.dumps(dumped, sort_keys=True, default=str)
+
+
+def make_etag(*parts: Any) -> str:
+    # キャッシュキーとデータのハッシュから、出力を作らずに ETag を決める
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else repr(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# 同じキーの取得処理が同時に走った場合、最初の1つだけを実行して結果を共有する
+class SingleFlight:
+    def __init__(self) -> None:
+        self._inflight: dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+
+        # 待っている側がキャンセルされても共有中の取得は止めない
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 待っている側がいなくなっていても警告を出さない
+        if not task.cancelled():
+            task.exception()
+
+
+class SWREntry(BaseModel):
+    value: Any
+    fetched_at: float
+
+
+# stale-while-revalidate なデータキャッシュ
+# soft_ttl を過ぎたら古い値を返しつつ裏で取り直し、hard_ttl を過ぎたら取得を待つ
+class SWRCache:
+    def __init__(self, soft_ttl: float, hard_ttl: float, max_entries: int) -> None:
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[Hashable, SWREntry]" = OrderedDict()
+        self._flight = SingleFlight()
+        # 実行中のバックグラウンド更新 (GC されないように参照を持つ)
+        self._refreshing: set["asyncio.Task[Any]"] = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> T:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.soft_ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if age < self.hard_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._refresh(key, fetch)
+                return entry.value
+
+        self.misses += 1
+        return await self._flight.do(key, lambda: self._fetch(key, fetch))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+            "entries": len(self._entries),
+        }
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> T:
+        value = await fetch()
+        self._entries[key] = SWREntry(value=value, fetched_at=time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> None:
+        async def refresh() -> None:
+            try:
+                await self._flight.do(key, lambda: self._fetch(key, fetch))
+            except Exception:
+                # 失敗しても古い値を hard_ttl まで使い続ける
+                self.refresh_errors += 1
+                logger.warning("background refresh failed: %r", key, exc_info=True)
+
+        task = asyncio.ensure_future(refresh())
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
@@ -1,12 +1,64 @@
-from typing import Union, Literal, Optional
+from typing import Union, Literal, Optional, Hashable, Iterator
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
 
 from src.themes import Theme, THEMES
+from src.cards.minify import minify_markup, minify_css
+from src.timing import phase
+from src.metrics import RENDER_SECONDS
 
 Auto = Literal["auto"]
 
+# テンプレートに値を差し込む位置の印
+SLOT = "\x00"
+STYLE_SLOT = "\x01"
+
+# コンパイル済みテンプレートの上限 (viewbox の高さはオプションで変わるため)
+TEMPLATE_CACHE_MAX_ENTRIES = 256
+
+
+@contextmanager
+def measure_render(card: str) -> Iterator[None]:
+    # 描画にかかった時間を Server-Timing (render) とメトリクスに記録する
+    start = time.perf_counter()
+    with phase("render"):
+        yield
+    RENDER_SECONDS.observe(time.perf_counter() - start, card=card)
+
+
+# テーマ・サイズだけで決まる部分を先に組み立てたカードの骨格
+# render では タイトル・本文・動的な CSS を差し込むだけにする
+class CardTemplate:
+    def __init__(
+        self, head: str, title_start: str, body_start: str, style_start: str, tail: str
+    ) -> None:
+        self.head = head
+        self.title_start = title_start
+        self.body_start = body_start
+        self.style_start = style_start
+        self.tail = tail
+
+    def render(self, size_attrs: str, title: str, body: str, dynamic_styles: str) -> str:
+        return "".join(
+            (
+                self.head,
+                size_attrs,
+                self.title_start,
+                title,
+                self.body_start,
+                body,
+                self.style_start,
+                dynamic_styles,
+                self.tail,
+            )
+        )
+
 
 class Card(ABC):
+    _templates: "OrderedDict[Hashable, CardTemplate]" = OrderedDict()
+
     def __init__(
         self,
         width: Union[int, Auto] = "auto",
@@ -20,6 +72,7 @@ class Card(ABC):
         self._viewbox_width = viewbox_width
         self._viewbox_height = viewbox_height
         self._theme = theme
+        self._minify = False
 
     @abstractmethod
     def _render_title(self):
@@ -30,32 +83,94 @@ class Card(ABC):
         ...
 
     def _styles(self) -> str:
+        # テーマ・viewbox・アニメーションの有無だけで決まる CSS (テンプレートに埋め込まれる)
+        return ""
+
+    def _dynamic_styles(self) -> str:
+        # データによって変わる CSS (render のたびに作る)
         return ""
 
-    def render(self):
+    def _animated(self) -> bool:
+        return True
+
+    @classmethod
+    def clear_templates(cls) -> None:
+        Card._templates.clear()
+
+    def render(self, minify: bool = False):
+        with measure_render(type(self).__name__):
+            return self._render(minify)
+
+    def _render(self, minify: bool) -> str:
+        # minify: 本番用。空白を詰め、テスト用の属性を出さない
+        self._minify = minify
+
+        size_attrs = "".join(
+            (
+                f' width="{self._width}"' if type(self._width) == int else "",
+                f' height="{self._height}"' if type(self._height) == int else "",
+            )
+        )
+        title, body, dynamic_styles = (
+            self._render_title(),
+            self._render_body(),
+            self._dynamic_styles(),
+        )
+        if minify:
+            title, body = minify_markup(title), minify_markup(body)
+            dynamic_styles = minify_css(dynamic_styles)
+
+        return self._template().render(size_attrs, title, body, dynamic_styles)
+
+    def _template_key(self) -> Hashable:
+        return (
+            type(self),
+            tuple(self._theme.model_dump().values()) if self._theme else None,
+            self._viewbox_width,
+            self._viewbox_height,
+            self._animated(),
+            self._minify,
+        )
+
+    def _template(self) -> CardTemplate:
+        templates = Card._templates
+        key = self._template_key()
+        template = templates.get(key)
+        if template is None:
+            template = self._compile_template(self._minify)
+            templates[key] = template
+            while len(templates) > TEMPLATE_CACHE_MAX_ENTRIES:
+                templates.popitem(last=False)
+        else:
+            templates.move_to_end(key)
+        return template
+
+    def _compile_template(self, minify: bool = False) -> CardTemplate:
+        theme, width, height = self._theme, self._viewbox_width, self._viewbox_height
+        assert theme is not None and width is not None and height is not None
         style = f"""
             #svg-body {{
                 margin: 0;
-                font-family: {self._theme.font_family};
-                color: {self._theme.text_color};
-                height: {self._viewbox_height}px;
-                width: {self._viewbox_width}px;
+                font-family: {theme.font_family};
+                color: {theme.text_color};
+                height: {height}px;
+                width: {width}px;
             }}
              #card {{
-                width: {self._viewbox_width - 2}px;
-                height: {self._viewbox_height - 2}px;
-                
+                width: {width - 2}px;
+                height: {height - 2}px;
+
                 display: flex;
                 position: relative;
-                background-color: {self._theme.background_color};
+                background-color: {theme.background_color};
 
                 border: 1px solid rgb(228, 226, 226);
                 border-radius: 10px;
             }}
             #card-body {{
                 margin: 20px;
-                width: {self._viewbox_width - 40}px;
-                height: {self._viewbox_height - 40}px;
+                width: {width - 40}px;
+                height: {height - 40}px;
                 display: flex;
                 flex-direction: column;
             }}
@@ -69,27 +184,34 @@ class Card(ABC):
 
         style += self._styles()
 
-        return f"""
-            <svg version="1.1" 
+        # 差し込む位置に印を付けた骨格を作り、(必要なら) 詰めてから分割する
+        skeleton = f"""
+            <svg version="1.1"
                 viewBox="0 0 {self._viewbox_width} {self._viewbox_height}"
-                xmlns="http://www.w3.org/2000/svg"
-                {f'width="{self._width}"' if type(self._width) == int else ""}
-                {f'height="{self._height}"' if type(self._height) == int else ""}
+                xmlns="http://www.w3.org/2000/svg"{SLOT}
             >
                 <foreignObject width="{self._viewbox_width}" height="{self._viewbox_height}" requiredExtensions="http://www.w3.org/1999/xhtml">
                     <body id="svg-body" xmlns="http://www.w3.org/1999/xhtml">
                         <div id="card">
                             <div id="card-body">
                                 <div id="title-container">
-                                    {self._render_title()}
+                                    {SLOT}
                                 </div>
                                 <div id="body-container">
-                                    {self._render_body()}
+                                    {SLOT}
                                 </div>
                             </div>
                         </div>
-                        <style id="main-style">{style}</style>
+                        <style id="main-style">{STYLE_SLOT}{SLOT}</style>
                     </body>
                 </foreignObject>
             </svg>
         """
+        if minify:
+            skeleton = minify_markup(skeleton)
+            style = minify_css(style)
+
+        head, title_start, body_start, style_start, tail = skeleton.replace(
+            STYLE_SLOT, style
+        ).split(SLOT)
+        return CardTemplate(head, title_start, body_start, style_start, tail)
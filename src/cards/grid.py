@@ -0,0 +1,62 @@
+from typing import List
+import base64
+import re
+
+from src.cards.card import measure_render
+
+VIEWBOX_PATTERN = re.compile(rb'viewBox="0 0 (\d+) (\d+)"')
+
+
+# 生成済みのカード (SVG) を1枚の SVG に並べる
+# カードごとに CSS (id やレーティングの色) がぶつからないように、
+# それぞれ別の画像 (data URI) として埋め込む
+class GridPanel:
+    def __init__(self, svg: bytes) -> None:
+        self.svg = svg
+        m = VIEWBOX_PATTERN.search(svg)
+        if m is None:
+            raise ValueError("Invalid Card.", "viewBox is not found.")
+        self.width, self.height = int(m.group(1)), int(m.group(2))
+
+
+class GridCard:
+    def __init__(self, panels: List[bytes], columns: int = 2, gap: int = 10) -> None:
+        self._panels = [GridPanel(svg) for svg in panels]
+        self._columns = max(1, min(columns, len(panels) or 1))
+        self._gap = gap
+
+    def render(self) -> str:
+        with measure_render(type(self).__name__):
+            return self._render()
+
+    def _render(self) -> str:
+        # 列の幅・行の高さは、その列・行で一番大きいカードに合わせる
+        rows = [
+            self._panels[i : i + self._columns]
+            for i in range(0, len(self._panels), self._columns)
+        ]
+        column_width = max((p.width for p in self._panels), default=0)
+        row_heights = [max(p.height for p in row) for row in rows]
+
+        images = []
+        y = 0
+        for row, row_height in zip(rows, row_heights):
+            for j, panel in enumerate(row):
+                x = j * (column_width + self._gap)
+                data = base64.b64encode(panel.svg).decode()
+                images.append(
+                    f'<image x="{x}" y="{y}" width="{panel.width}" height="{panel.height}"'
+                    f' href="data:image/svg+xml;base64,{data}"/>'
+                )
+            y += row_height + self._gap
+
+        width = self._columns * (column_width + self._gap) - self._gap
+        height = max(0, y - self._gap)
+        return "".join(
+            (
+                f'<svg version="1.1" viewBox="0 0 {width} {height}"',
+                ' xmlns="http://www.w3.org/2000/svg">',
+                *images,
+                "</svg>",
+            )
+        )
@@ -1,19 +1,16 @@
-from typing import Any, Union, Literal, List
+from typing import Any, Union, Literal, List, Optional
 import datetime
 
 from pydantic import BaseModel
 
 from src.cards.card import Card
 from src.atcoder_problems import Submission
+from src.submission_table import SubmissionTable
 from src.themes import Theme, THEMES
-from src.utils import date_range
+from src.day_buckets import DayBuckets, Type, parse_tz_offset, today as tz_today
+from src.timing import timed
 
 Auto = Literal["auto"]
-Type = Literal[
-    "all",
-    "ac",
-    "unique_ac",
-]
 
 
 class StatsItem(BaseModel):
@@ -29,13 +26,21 @@ class HeatmapOption(BaseModel):
     type: Type = "all"
     title_lines: int = 1
     disable_animations: bool = False
+    # 日付の区切りに使うタイムゾーン (ex: JST, +09:00)。None は DEFAULT_TZ (JST)
+    tz: Optional[str] = None
+
+
+# 提出数の多さ (0 ~ 4) ごとのセルの色
+CELL_COLORS = ["#EBEDF0", "#C6E48B", "#7BC96F", "#239A3B", "#196127"]
 
 
 class HeatmapCard(Card):
+    weeks_num = 24
+
     def __init__(
         self,
         username: str,
-        submissions: List[Submission],
+        submissions: Union[List[Submission], SubmissionTable, DayBuckets],
         option: HeatmapOption = HeatmapOption(),
     ) -> None:
         self._username = username
@@ -43,13 +48,10 @@ class HeatmapCard(Card):
         self._option = option
         if self._option.title_lines < 1:
             self._option.title_lines = 1
-        self._weeks_num = 24
-        now = datetime.date.today()
-        self._today = datetime.datetime(now.year, now.month, now.day)
-        to_ = self._today + datetime.timedelta(
-            days=(7 - (self._today.isoweekday() % 7))
-        )
-        from_ = to_ - datetime.timedelta(weeks=self._weeks_num)
+        self._weeks_num = self.weeks_num
+        self._offset = parse_tz_offset(self._option.tz)
+        self._today = self.today(self._option.tz)
+        from_, to_ = self.date_window(self._today)
 
         self._submissions = self._submission_per_day(
             submissions, from_, to_, option.type
@@ -62,61 +64,68 @@ class HeatmapCard(Card):
             theme=self._option.theme,
         )
 
+    @classmethod
+    def today(cls, tz: Optional[str] = None) -> datetime.datetime:
+        now = tz_today(parse_tz_offset(tz))
+        return datetime.datetime(now.year, now.month, now.day)
+
+    @classmethod
+    def date_window(
+        cls, today: Optional[datetime.datetime] = None
+    ) -> tuple[datetime.datetime, datetime.datetime]:
+        # カードに表示する期間 (weeks_num 週前の日曜日 ~ 今週の土曜日)
+        if today is None:
+            today = cls.today()
+        to_ = today + datetime.timedelta(days=(7 - (today.isoweekday() % 7)))
+        from_ = to_ - datetime.timedelta(weeks=cls.weeks_num)
+        return from_, to_
+
+    @classmethod
+    def window_buckets(cls, tz: Optional[str] = None) -> DayBuckets:
+        # カードに表示する期間の (空の) 日ごとの提出数
+        from_, to_ = cls.date_window(cls.today(tz))
+        return DayBuckets.from_dates(from_.date(), to_.date(), parse_tz_offset(tz))
+
+    @classmethod
+    def window_start_second(cls, tz: Optional[str] = None) -> int:
+        # カードに表示する最初の日の 0 時 (unix time)
+        return cls.window_buckets(tz).start_second
+
+    @timed("heatmap_buckets")
     def _submission_per_day(
         self,
-        submissions: List[Submission],
+        submissions: Union[List[Submission], SubmissionTable, DayBuckets],
         from_: datetime.datetime,
         to_: datetime.datetime,
         type_: Type = "all",
-    ) -> List[tuple[datetime.datetime, List[Submission]]]:
-        submissions.sort(key=lambda x: x.epoch_second)
-
-        submissions_per_day: List[tuple[datetime.datetime, List[Submission]]] = []
-        last_sub_idx = 0
-        for date in date_range(from_, to_):
-            subs = []
-            from_unix = date.timestamp()
-            end_unix = (date + datetime.timedelta(days=1)).timestamp()
-            added_problems = set()
-            for i in range(last_sub_idx, len(submissions)):
-                submission = submissions[i]
-                if not (from_unix <= submission.epoch_second < end_unix):
-                    if end_unix <= submission.epoch_second:
-                        last_sub_idx = i
-                        break
-                    continue
-
-                if type_ == "all":
-                    subs.append(submission)
-                elif type_ == "ac":
-                    if submission.result == "AC":
-                        subs.append(submission)
-                elif type_ == "unique_ac":
-                    if (
-                        submission.problem_id not in added_problems
-                        and submission.result == "AC"
-                    ):
-                        subs.append(submission)
-                        added_problems.add(submission.problem_id)
-                else:
-                    subs.append(submission)
-
-            submissions_per_day.append((date, subs))
+    ) -> List[tuple[datetime.datetime, int]]:
+        buckets = DayBuckets.from_dates(from_.date(), to_.date(), self._offset)
+        if isinstance(submissions, DayBuckets):
+            # 集計済み (複数ユーザーの合計など) のものは期間を合わせて足すだけ
+            buckets.merge(submissions)
+        else:
+            buckets.add_submissions(submissions, type_)
 
-        return submissions_per_day
+        return [
+            (datetime.datetime(date.year, date.month, date.day), count)
+            for date, count in buckets.items()
+        ]
 
-    def _get_cell_color(self, percentile: float) -> str:
+    def _get_cell_level(self, percentile: float) -> int:
         if percentile == 0.0:
-            return "#EBEDF0"
+            return 0
         else:
             if 0 < percentile <= 0.25:
-                return "#C6E48B"
+                return 1
             elif 0.25 < percentile <= 0.50:
-                return "#7BC96F"
+                return 2
             elif 0.50 < percentile <= 0.75:
-                return "#239A3B"
+                return 3
             else:
-                return "#196127"
+                return 4
+
+    def _get_cell_color(self, percentile: float) -> str:
+        return CELL_COLORS[self._get_cell_level(percentile)]
 
     def _render_title(self) -> str:
         type_ = self._option.type
@@ -135,8 +144,8 @@ class HeatmapCard(Card):
 
     def _render_body(self):
         max_sub_cnt = 1
-        for _, subs in self._submissions:
-            max_sub_cnt = max(max_sub_cnt, len(subs))
+        for _, count in self._submissions:
+            max_sub_cnt = max(max_sub_cnt, count)
 
         week_labels = ["", "Mo", "", "We", "", "Fr", ""]
         month_labels = [
@@ -156,22 +165,24 @@ class HeatmapCard(Card):
 
         month_cells = ['<div class="heatmap-cell month-label"></div>']
         heatmap_week_cells = [[] for _ in range(7)]  # index0: Sunday ~ index6: Saturday
-        for i, (date, submissions) in enumerate(self._submissions):
+        for i, (date, count) in enumerate(self._submissions):
             if date > self._today:
                 break
 
-            heatmap_week_cells[date.isoweekday() % 7].append(
-                f"""
+            if self._minify:
+                # 色はクラスで指定し、テスト用の属性は出さない
+                cell = f'<div class="heatmap-cell level-{self._get_cell_level(count / max_sub_cnt)}" id="{date.date().isoformat()}"></div>'
+            else:
+                cell = f"""
                 <div 
                     class="heatmap-cell" 
-                    id="{date.strftime("%Y-%m-%d")}" 
-                    style="background-color: {self._get_cell_color(len(submissions)/max_sub_cnt)};"
-                    _test_submission_count="{len(submissions)}"
+                    id="{date.date().isoformat()}" 
+                    style="background-color: {self._get_cell_color(count / max_sub_cnt)};"
+                    _test_submission_count="{count}"
                 ></div>
             """
-            )
+            heatmap_week_cells[date.isoweekday() % 7].append(cell)
             if i % 7 == 0:
-                print(date)
                 if date.month == 12:
                     next_month_first = datetime.datetime(date.year + 1, 1, 1)
                 else:
@@ -207,6 +218,9 @@ class HeatmapCard(Card):
             </div>
         """
 
+    def _animated(self) -> bool:
+        return not self._option.disable_animations
+
     def _styles(self) -> str:
         theme = self._option.theme
 
@@ -279,6 +293,7 @@ class HeatmapCard(Card):
                 outline: 0;
                 line-height: 1;
             }}
+            {"".join(f".level-{i} {{ background-color: {color}; }}" for i, color in enumerate(CELL_COLORS))}
             .heatmap-row {{
                 display: flex;
                 flex-direction: row;
@@ -0,0 +1,28 @@
+from functools import lru_cache
+import re
+
+# テンプレートのインデントや改行を詰めて、転送量を減らす
+# 空白を1つにまとめてから、タグや CSS の記号の前後の空白を消す
+# (カードの要素はすべてブロックなので、タグの前後の空白を消しても表示は変わらない)
+
+CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+
+# calc() の中の +/- は空白が必要なので詰めない
+CSS_PUNCTUATION = "{};:,>"
+
+
+def minify_markup(markup: str) -> str:
+    markup = " ".join(markup.split())
+    for old, new in (("> ", ">"), (" <", "<"), (" >", ">"), (" />", "/>")):
+        markup = markup.replace(old, new)
+    return markup
+
+
+# カードごとに変わる CSS も色・角度の組み合わせ程度なので結果を使い回す
+@lru_cache(maxsize=1024)
+def minify_css(css: str) -> str:
+    css = CSS_COMMENT.sub("", css)
+    css = " ".join(css.split())
+    for c in CSS_PUNCTUATION:
+        css = css.replace(f" {c}", c).replace(f"{c} ", c)
+    return css.replace(";}", "}")
@@ -1,4 +1,5 @@
 from typing import Any, Union, Literal
+from functools import lru_cache
 import html
 
 from pydantic import BaseModel
@@ -194,25 +195,36 @@ class StatsCard(Card):
                 </div>''' if show_history else ""}
         """
 
-    def _styles(self) -> str:
-        theme = self._option.theme
+    def _animated(self) -> bool:
+        return not self._option.disable_animations
 
+    def _dynamic_styles(self) -> str:
+        # レーティングで変わる部分だけ
         color = get_rating_color(self._userdata.rating)
         deg = 360 * (self._userdata.rating % 400) // 400
+        background_color = self._option.theme.background_color
 
-        # 暫定対応
-        # できれば@propertyやanimationを使いたい
-        keyframes = []
-        if not self._option.disable_animations:
-            N = 30
-            for i in range(N + 1):
-                prop = f"""
-                    {i * 100 // N}% {{
-                        background-image: radial-gradient({self._option.theme.background_color} 60%, transparent 61%),
-                        conic-gradient({color} {i * deg/N}deg, {color}33 {i * deg/N}deg 360deg);
-                    }}
-                """
-                keyframes.append(prop)
+        keyframes = (
+            ""
+            if self._option.disable_animations
+            else _rating_keyframes(background_color, color, deg)
+        )
+
+        return f"""
+            .circle {{
+                background-image: radial-gradient({background_color} 60%, transparent 61%), conic-gradient({color} {deg}deg, {color}33 {deg}deg 360deg);
+            }}
+            .rating {{
+                color: {color};
+            }}
+
+            @keyframes conic-gradient {{
+                {keyframes}
+            }}
+        """
+
+    def _styles(self) -> str:
+        theme = self._option.theme
 
         return f"""
             #title {{
@@ -282,23 +294,6 @@ class StatsCard(Card):
             }}
 
             /* Rating Circle */
-            /*
-            これを使ってランクサークルのアニメーションができそうだが上手くいかない
-            @property --deg {{
-                syntax: "&lt;angle&gt;"
-                inherites: false;
-                initial-value: 0deg
-            }}
-            @keyframes conic-gradient {{
-                0% {{
-                    --deg: f{f'{deg}deg' if self._option.disable_animations else "0deg"};
-                }}
-                100% {{
-                    --deg: {deg}deg;
-                }}
-            }}
-            */
-            
             .container {{
                 width: 95px;
                 height: 95px;
@@ -319,10 +314,6 @@ class StatsCard(Card):
                 animation-name: conic-gradient;
                 animation-duration: 0.8s;
                 animation-fill-mode: forwards;
-                background-image: radial-gradient({self._option.theme.background_color} 60%, transparent 61%), conic-gradient({color} {deg}deg, {color}33 {deg}deg 360deg);
-            }}
-            .rating {{
-                color: {color};
             }}
             #rating-label {{
                 font-size: 16px;
@@ -333,10 +324,6 @@ class StatsCard(Card):
                 font-weight: 800;
             }}
 
-            @keyframes conic-gradient {{
-                {"".join(keyframes)}
-            }}
-
             /* Competition History */
             .compe-val {{
                 font-size: 14px;
@@ -368,3 +355,21 @@ class StatsCard(Card):
                 -webkit-line-clamp: 2;
             }}
         """
+
+
+# 色と角度の組み合わせは限られるので、同じものは使い回す
+@lru_cache(maxsize=1024)
+def _rating_keyframes(background_color: str, color: str, deg: int) -> str:
+    # 暫定対応
+    # できれば@propertyやanimationを使いたい
+    keyframes = []
+    N = 30
+    for i in range(N + 1):
+        prop = f"""
+            {i * 100 // N}% {{
+                background-image: radial-gradient({background_color} 60%, transparent 61%),
+                conic-gradient({color} {i * deg/N}deg, {color}33 {i * deg/N}deg 360deg);
+            }}
+        """
+        keyframes.append(prop)
+    return "".join(keyframes)
@@ -0,0 +1,119 @@
+from typing import Optional, Coroutine, Any, TypeVar, AsyncIterator
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import asyncio
+import time
+import weakref
+
+import httpx
+
+from src.metrics import UPSTREAM_SECONDS, UPSTREAM_RESPONSES, status_label
+from src.tracing import span
+
+T = TypeVar("T")
+
+
+# atcoder.jp / kenkoooo.com への通信失敗・タイムアウト
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamClient:
+    # 接続は host ごとに使い回す (keep-alive)
+    timeout = httpx.Timeout(5.0, connect=3.0)
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    # テスト等で差し替えるためのトランスポート
+    transport: Optional[httpx.AsyncBaseTransport] = None
+
+    # httpx.AsyncClient はイベントループに紐づくので、ループごとに保持する
+    _clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]]" = (
+        weakref.WeakKeyDictionary()
+    )
+
+    @classmethod
+    def get_client(cls, url: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        clients = cls._clients.setdefault(loop, {})
+
+        host = urlsplit(url).netloc
+        client = clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=cls.timeout,
+                limits=cls.limits,
+                transport=cls.transport,
+                follow_redirects=True,
+            )
+            clients[host] = client
+
+        return client
+
+    @classmethod
+    async def get(cls, url: str, **kwargs: Any) -> httpx.Response:
+        client = cls.get_client(url)
+        with span("upstream", url=url) as s:
+            start = time.perf_counter()
+            try:
+                res = await client.get(url, **kwargs)
+            except httpx.TransportError as e:
+                cls._observe(url, start, None)
+                raise cls._upstream_error(url, e) from e
+            cls._observe(url, start, res.status_code)
+            if s is not None:
+                s.attributes["status"] = res.status_code
+            return res
+
+    # レスポンスボディを読み込みながら処理する場合に使う
+    # ブロックを途中で抜けると残りのボディは読まずに接続を閉じる
+    @classmethod
+    @asynccontextmanager
+    async def stream(cls, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        client = cls.get_client(url)
+        # スパンはボディを読み終える (途中で抜ける) までを含む
+        with span("upstream", url=url, stream=True) as s:
+            start = time.perf_counter()
+            observed = False
+            try:
+                async with client.stream("GET", url, **kwargs) as res:
+                    # ボディを読む前 (ヘッダーを受け取るまで) の時間
+                    cls._observe(url, start, res.status_code)
+                    observed = True
+                    if s is not None:
+                        s.attributes["status"] = res.status_code
+                    yield res
+            except httpx.TransportError as e:
+                if not observed:
+                    cls._observe(url, start, None)
+                raise cls._upstream_error(url, e) from e
+
+    @classmethod
+    def _observe(cls, url: str, start: float, status: Optional[int]) -> None:
+        host = urlsplit(url).hostname or ""
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, host=host)
+        UPSTREAM_RESPONSES.inc(host=host, status=status_label(status))
+
+    @classmethod
+    def _upstream_error(cls, url: str, e: httpx.TransportError) -> UpstreamError:
+        host = urlsplit(url).netloc
+        if isinstance(e, httpx.TimeoutException):
+            return UpstreamError("Upstream Timeout.", f"No response from {host}.")
+        return UpstreamError("Upstream Connection Error.", f"Could not connect to {host}.")
+
+    @classmethod
+    async def aclose(cls) -> None:
+        loop = asyncio.get_running_loop()
+        clients = cls._clients.pop(loop, {})
+        for client in clients.values():
+            await client.aclose()
+
+
+# 同期コードから呼び出すためのシム
+# 一時的なイベントループに紐づいたクライアントはループ終了前に閉じる
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    async def runner() -> T:
+        try:
+            return await coro
+        finally:
+            await UpstreamClient.aclose()
+
+    return asyncio.run(runner())
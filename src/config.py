@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+# Vercel 上では /tmp 以外に書き込めないため、デフォルトは一時ディレクトリ配下
+CACHE_DIR = os.environ.get(
+    "ATCODER_README_STATS_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "atcoder-readme-stats"),
+)
+
+# 上流の URL (負荷試験ではローカルの代替サーバーに向ける)
+ATCODER_BASE_URL = os.environ.get(
+    "ATCODER_README_STATS_ATCODER_BASE_URL", "https://atcoder.jp"
+).rstrip("/")
+ATCODER_PROBLEMS_BASE_URL = os.environ.get(
+    "ATCODER_README_STATS_ATCODER_PROBLEMS_BASE_URL", "https://kenkoooo.com/atcoder"
+).rstrip("/")
+
+SUBMISSION_STORE_DIR = os.path.join(CACHE_DIR, "submissions")
+
+# 生成した SVG をプロセス内にキャッシュする上限 (bytes)
+SVG_CACHE_MAX_BYTES = int(
+    os.environ.get("ATCODER_README_STATS_SVG_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+)
+
+# ユーザーデータ・提出データのキャッシュ (stale-while-revalidate)
+DATA_CACHE_SOFT_TTL = int(os.environ.get("ATCODER_README_STATS_DATA_SOFT_TTL", 60 * 60))
+DATA_CACHE_HARD_TTL = int(
+    os.environ.get("ATCODER_README_STATS_DATA_HARD_TTL", 24 * 60 * 60)
+)
+DATA_CACHE_MAX_ENTRIES = int(
+    os.environ.get("ATCODER_README_STATS_DATA_CACHE_MAX_ENTRIES", 256)
+)
+
+# problem-models.json のローカルコピー
+PROBLEM_MODEL_DIR = os.path.join(CACHE_DIR, "problem_models")
+# 前回の確認からこの秒数が経つまでは上流に問い合わせない
+PROBLEM_MODEL_REVALIDATE_INTERVAL = int(
+    os.environ.get("ATCODER_README_STATS_PROBLEM_MODEL_REVALIDATE_INTERVAL", 6 * 60 * 60)
+)
+
+# 本番用に空白を詰めた SVG を返す (0 にするとテンプレートのままの出力)
+MINIFY_SVG = os.environ.get("ATCODER_README_STATS_MINIFY_SVG", "1") not in ("0", "false")
+
+# 処理時間の合計がこのミリ秒を超えたリクエストの内訳をログに出す (0 なら出さない)
+SLOW_REQUEST_LOG_MS = float(os.environ.get("ATCODER_README_STATS_SLOW_REQUEST_LOG_MS", 0))
+
+# リクエストのトレース (JSONL)。どちらも 0 なら記録しない
+# 記録する割合 (0 ~ 1) と、必ず記録する処理時間 (ミリ秒)
+TRACE_SAMPLE_RATE = float(os.environ.get("ATCODER_README_STATS_TRACE_SAMPLE_RATE", 0))
+TRACE_SLOW_MS = float(os.environ.get("ATCODER_README_STATS_TRACE_SLOW_MS", 0))
+TRACE_FILE = os.environ.get(
+    "ATCODER_README_STATS_TRACE_FILE", os.path.join(CACHE_DIR, "traces.jsonl")
+)
+TRACE_FILE_MAX_BYTES = int(
+    os.environ.get("ATCODER_README_STATS_TRACE_FILE_MAX_BYTES", 10 * 1024 * 1024)
+)
+TRACE_FILE_BACKUP_COUNT = int(os.environ.get("ATCODER_README_STATS_TRACE_FILE_BACKUP_COUNT", 3))
+
+# 複数ユーザーのカードをまとめて返すときの人数の上限と、同時に取得する人数
+BATCH_MAX_USERS = int(os.environ.get("ATCODER_README_STATS_BATCH_MAX_USERS", 50))
+BATCH_CONCURRENCY = int(os.environ.get("ATCODER_README_STATS_BATCH_CONCURRENCY", 8))
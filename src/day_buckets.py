@@ -0,0 +1,152 @@
+from typing import Optional, Iterable, List, Literal
+import datetime
+import re
+import time
+
+from src.const import ONE_DAY_SECOND
+from src.submission_table import SubmissionTable
+
+Type = Literal[
+    "all",
+    "ac",
+    "unique_ac",
+]
+
+EPOCH_DATE = datetime.date(1970, 1, 1)
+
+TZ_NAMES = {
+    "UTC": 0,
+    "GMT": 0,
+    "Z": 0,
+    "JST": 9 * 60 * 60,
+    "KST": 9 * 60 * 60,
+}
+
+TZ_OFFSET_PATTERN = re.compile(r"(?:UTC|GMT)?([+-])(\d{1,2})(?::?(\d{2}))?")
+# クエリ文字列で "+" をエンコードせずに渡すと空白になる (tz=+09:00 -> " 09:00")
+PLUS_AS_SPACE_PATTERN = re.compile(r"^((?:UTC|GMT)?) (?=\d)")
+
+
+# 指定がないときのタイムゾーン (AtCoder のコンテストの日付に合わせる)
+# サーバーのローカルタイムは夏時間で期間の途中にオフセットが変わるので使わない
+DEFAULT_TZ = "JST"
+
+
+def parse_tz_offset(tz: Optional[str] = None) -> int:
+    # タイムゾーンを UTC からのオフセット(秒)にする
+    if tz is None or tz == "":
+        tz = DEFAULT_TZ
+
+    # 空白を取り除く前に、数字の前の空白を "+" に戻す
+    name = PLUS_AS_SPACE_PATTERN.sub(r"\1+", tz.upper()).strip()
+    if name in TZ_NAMES:
+        return TZ_NAMES[name]
+
+    m = TZ_OFFSET_PATTERN.fullmatch(name)
+    if m:
+        sign, hours, minutes = m.group(1), int(m.group(2)), int(m.group(3) or 0)
+        if hours <= 14 and minutes < 60:
+            offset = hours * 60 * 60 + minutes * 60
+            return offset if sign == "+" else -offset
+
+    raise ValueError("Invalid Timezone.", "Use an offset like +09:00 or a name like JST.")
+
+
+def day_index(epoch_second: int, offset: int) -> int:
+    return (epoch_second + offset) // ONE_DAY_SECOND
+
+
+def date_to_day_index(date: datetime.date) -> int:
+    return (date - EPOCH_DATE).days
+
+
+def day_index_to_date(index: int) -> datetime.date:
+    return EPOCH_DATE + datetime.timedelta(days=index)
+
+
+def today(offset: int) -> datetime.date:
+    return day_index_to_date(day_index(int(time.time()), offset))
+
+
+# 日ごとの提出数を数える
+# epoch_second を整数演算で日付のインデックスに変換し、提出を1回だけ走査する
+class DayBuckets:
+    def __init__(self, start_day: int, days: int, offset: int = 0) -> None:
+        self.start_day = start_day
+        self.days = days
+        self.offset = offset
+        self.counts: List[int] = [0] * days
+
+    @classmethod
+    def from_dates(
+        cls, from_: datetime.date, to_: datetime.date, offset: int = 0
+    ) -> "DayBuckets":
+        start_day = date_to_day_index(from_)
+        return cls(start_day, date_to_day_index(to_) - start_day, offset)
+
+    @property
+    def start_second(self) -> int:
+        # 集計期間の開始時刻 (unix time)
+        return self.start_day * ONE_DAY_SECOND - self.offset
+
+    def add(
+        self,
+        epoch_seconds: Iterable[int],
+        problem_ids: Iterable[str],
+        results: Iterable[str],
+        type_: Type = "all",
+    ) -> None:
+        start_day, days, offset = self.start_day, self.days, self.offset
+        counts = self.counts
+
+        if type_ == "all":
+            for epoch_second in epoch_seconds:
+                i = (epoch_second + offset) // ONE_DAY_SECOND - start_day
+                if 0 <= i < days:
+                    counts[i] += 1
+            return
+
+        added_problems = set()
+        for epoch_second, problem_id, result in zip(epoch_seconds, problem_ids, results):
+            if result != "AC":
+                continue
+            i = (epoch_second + offset) // ONE_DAY_SECOND - start_day
+            if not 0 <= i < days:
+                continue
+            if type_ == "unique_ac":
+                # 同じ日に同じ問題を複数回 AC しても1回と数える
+                if (i, problem_id) in added_problems:
+                    continue
+                added_problems.add((i, problem_id))
+            counts[i] += 1
+
+    def add_submissions(self, submissions: Iterable, type_: Type = "all") -> None:
+        if isinstance(submissions, SubmissionTable):
+            # 列をそのまま使い、行ごとのオブジェクトは作らない
+            self.add(
+                submissions.epoch_seconds,
+                submissions.problem_ids(),
+                submissions.result_values(),
+                type_,
+            )
+            return
+
+        submissions = list(submissions)
+        self.add(
+            (s.epoch_second for s in submissions),
+            (s.problem_id for s in submissions),
+            (s.result for s in submissions),
+            type_,
+        )
+
+    def merge(self, other: "DayBuckets") -> None:
+        for i, count in enumerate(other.counts):
+            j = other.start_day + i - self.start_day
+            if 0 <= j < self.days:
+                self.counts[j] += count
+
+    def items(self) -> List[tuple[datetime.date, int]]:
+        return [
+            (day_index_to_date(self.start_day + i), count)
+            for i, count in enumerate(self.counts)
+        ]
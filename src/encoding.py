@@ -0,0 +1,119 @@
+from typing import Optional, List
+import gzip
+
+from pydantic import BaseModel
+
+try:
+    import brotli  # type: ignore[import-untyped]
+except ImportError:  # brotli がなければ gzip だけ返す
+    brotli = None
+
+GZIP_LEVEL = 9
+# 11 は 1 枚に数十 ms かかるので、圧縮率がほぼ同じ 9 にする
+BROTLI_QUALITY = 9
+
+# Accept-Encoding: * で受け付けるもの (優先する順)
+WILDCARD_ENCODINGS = ["br", "gzip", "identity"]
+
+
+# レスポンスの本文と、あらかじめ圧縮しておいたもの
+class EncodedBody(BaseModel):
+    identity: bytes
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+    # 元になったデータとオプションから計算した ETag (引用符・エンコーディングなし)
+    etag: Optional[str] = None
+
+    @classmethod
+    def compress(cls, body: bytes, etag: Optional[str] = None) -> "EncodedBody":
+        return cls(
+            identity=body,
+            etag=etag,
+            gzip=gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+            br=brotli.compress(body, quality=BROTLI_QUALITY) if brotli else None,
+        )
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in (self.identity, self.gzip, self.br) if v is not None)
+
+    def negotiate(self, accept_encoding: Optional[str]) -> tuple[str, bytes]:
+        available = [e for e in WILDCARD_ENCODINGS if getattr(self, e) is not None]
+        encoding = choose_encoding(accept_encoding, available)
+        return encoding, getattr(self, encoding)
+
+
+# 圧縮して持っておけるもの (優先する順)
+AVAILABLE_ENCODINGS = [e for e in WILDCARD_ENCODINGS if brotli or e != "br"]
+
+
+def choose_encoding(
+    accept_encoding: Optional[str], available: List[str] = AVAILABLE_ENCODINGS
+) -> str:
+    # Accept-Encoding の q 値が一番大きいもの、同じなら br > gzip > identity
+    # 本文がなくても決められるので、304 を返すときにも使う
+    accepted = parse_accept_encoding(accept_encoding)
+    candidates = [
+        (accepted[encoding], -i, encoding)
+        for i, encoding in enumerate(available)
+        if accepted.get(encoding, 0) > 0
+    ]
+    if not candidates:
+        return "identity"
+    return max(candidates)[2]
+
+
+def parse_accept_encoding(accept_encoding: Optional[str]) -> dict[str, float]:
+    # ex: "gzip, deflate, br;q=0.8" -> {"gzip": 1.0, "deflate": 1.0, "br": 0.8, "identity": 1.0}
+    accepted: dict[str, float] = {}
+    wildcard: Optional[float] = None
+    for item in (accept_encoding or "").split(","):
+        encoding, _, params = item.strip().partition(";")
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+
+        if encoding == "*":
+            wildcard = q
+        else:
+            accepted[encoding] = q
+
+    if wildcard is not None:
+        for encoding in WILDCARD_ENCODINGS:
+            accepted.setdefault(encoding, wildcard)
+    # identity は明示的に拒否されない限り使える
+    accepted.setdefault("identity", 1.0)
+    return accepted
+
+
+def etag_header(etag: str, encoding: str) -> str:
+    # 圧縮したものは中身が違うので別の強い ETag にする
+    return f'"{etag}"' if encoding == "identity" else f'"{etag}-{encoding}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match は弱い比較 (W/ やエンコーディングの違いは無視する)
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        for encoding in WILDCARD_ENCODINGS:
+            if tag.endswith(f"-{encoding}"):
+                tag = tag[: -len(encoding) - 1]
+                break
+        if tag == etag:
+            return True
+    return False
@@ -0,0 +1,247 @@
+from typing import Callable, Iterable, List, Optional, Sequence
+import bisect
+import threading
+
+# Prometheus のテキスト形式で出力するだけの最小限のメトリクス
+# (ラベルの組み合わせごとに値を持つ Counter / Gauge / Histogram)
+
+PREFIX = "atcoder_readme_stats_"
+
+# 秒単位の処理時間用
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    type_ = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_}"]
+
+    def samples(self) -> List[str]:
+        return []
+
+    def clear(self) -> None:
+        ...
+
+
+class Counter(Metric):
+    type_ = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+            for key, value in values
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Metric):
+    # 出力するときに collect を呼んで値を取る (キャッシュの件数など)
+    # 他で数えているカウンターをそのまま出すときは type_="counter" にする
+    type_ = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[tuple[LabelValues, float]]],
+        type_: str = "gauge",
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+        self.type_ = type_
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+            for key, value in sorted(self.collect())
+        ]
+
+
+class HistogramValue:
+    def __init__(self, buckets: int) -> None:
+        # 各バケット (le) に入った件数。累積は出力するときに計算する
+        self.counts = [0] * buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: dict[LabelValues, HistogramValue] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = HistogramValue(len(self.buckets))
+            v.counts[i] += 1
+            v.sum += value
+            v.count += 1
+
+    def count(self, **labels: str) -> int:
+        v = self._values.get(self._key(labels))
+        return v.count if v else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            values = sorted(self._values.items())
+            for key, v in values:
+                cumulative = 0
+                for le, n in zip(self.buckets, v.counts):
+                    cumulative += n
+                    labels = format_labels(self.labelnames, key, f'le="{format_value(le)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {format_value(v.sum)}")
+                lines.append(f"{self.name}_count{labels} {v.count}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))  # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))  # type: ignore
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[tuple[LabelValues, float]]],
+        type_: str = "gauge",
+    ) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, collect, type_))  # type: ignore
+
+    def clear(self) -> None:
+        for metric in self.metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.header()
+            lines += metric.samples()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# 上流 (atcoder.jp / kenkoooo.com) への通信
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "upstream_request_duration_seconds",
+    "Time until response headers from upstream.",
+    ["host"],
+)
+UPSTREAM_RESPONSES = REGISTRY.counter(
+    "upstream_responses_total",
+    "Upstream responses by status code (error: no response).",
+    ["host", "status"],
+)
+SUBMISSION_PAGES = REGISTRY.histogram(
+    "submission_pages",
+    "Pages fetched per submissions fetch.",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+# 描画
+RENDER_SECONDS = REGISTRY.histogram(
+    "render_duration_seconds",
+    "Card render time.",
+    ["card"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+# リクエスト (ルートは /stats/{username} のようなテンプレート)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "request_duration_seconds",
+    "Request handling time until response headers.",
+    ["route", "status"],
+)
+ERROR_CARDS = REGISTRY.counter(
+    "error_cards_total",
+    "Error cards returned by cause.",
+    ["endpoint", "cause"],
+)
+
+
+def status_label(status: Optional[int]) -> str:
+    return str(status) if status is not None else "error"
@@ -0,0 +1,225 @@
+from typing import Optional, Iterable, Sequence, List, Any, BinaryIO, Callable
+from array import array
+import json
+import logging
+import mmap
+import os
+import time
+
+import httpx
+from pydantic import BaseModel
+
+from src.config import (
+    PROBLEM_MODEL_DIR,
+    PROBLEM_MODEL_REVALIDATE_INTERVAL,
+    ATCODER_PROBLEMS_BASE_URL,
+)
+from src.client import UpstreamClient
+from src.cache import SingleFlight
+from src.utils import write_atomic
+
+logger = logging.getLogger(__name__)
+
+PROBLEM_MODELS_URL = f"{ATCODER_PROBLEMS_BASE_URL}/resources/problem-models.json"
+
+# 保存形式を変えたら上げる (古い形式のファイルは読み捨てる)
+STORE_VERSION = 1
+
+# difficulty がない問題 (int32 の最小値)
+NO_DIFFICULTY = -(2**31)
+
+
+# problem_id -> difficulty の表
+# difficulty は int32 の配列で持ち、ファイルからは mmap で読む
+class ProblemDifficulties:
+    def __init__(self, problem_ids: List[str], difficulties: Sequence[int]) -> None:
+        self.problem_ids = problem_ids
+        self._index = {p: i for i, p in enumerate(problem_ids)}
+        self._difficulties = difficulties
+
+    @classmethod
+    def from_models(cls, models: dict[str, dict]) -> "ProblemDifficulties":
+        problem_ids = sorted(models)
+        difficulties = array("i")
+        for problem_id in problem_ids:
+            difficulty = models[problem_id].get("difficulty")
+            difficulties.append(
+                NO_DIFFICULTY if difficulty is None else int(round(difficulty))
+            )
+        return cls(problem_ids, difficulties)
+
+    def __len__(self) -> int:
+        return len(self.problem_ids)
+
+    def __contains__(self, problem_id: str) -> bool:
+        return problem_id in self._index
+
+    def get(self, problem_id: str) -> Optional[int]:
+        i = self._index.get(problem_id)
+        if i is None:
+            return None
+        difficulty = self._difficulties[i]
+        return None if difficulty == NO_DIFFICULTY else difficulty
+
+    def many(self, problem_ids: Iterable[str]) -> List[Optional[int]]:
+        return [self.get(p) for p in problem_ids]
+
+    def ids_bytes(self) -> bytes:
+        return "\n".join(self.problem_ids).encode("utf-8")
+
+    def difficulties_bytes(self) -> bytes:
+        return array("i", self._difficulties).tobytes()
+
+    @classmethod
+    def load(cls, ids_path: str, difficulties_path: str) -> Optional["ProblemDifficulties"]:
+        try:
+            with open(ids_path, "r", encoding="utf-8") as f:
+                content = f.read()
+            problem_ids = content.split("\n") if content else []
+
+            with open(difficulties_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size != len(problem_ids) * array("i").itemsize:
+                    return None
+                if size == 0:
+                    return cls(problem_ids, array("i"))
+                # ページキャッシュを共有するので複数プロセスでもメモリを食わない
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        return cls(problem_ids, memoryview(buffer).cast("i"))
+
+
+class ProblemModelMeta(BaseModel):
+    version: int = STORE_VERSION
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # 最後に上流へ確認した時刻 (unix time)
+    checked_at: float = 0.0
+    count: int = 0
+
+
+# problem-models.json をディスクに保存し、ETag / Last-Modified で再検証する
+class ProblemModelStore:
+    directory = PROBLEM_MODEL_DIR
+    revalidate_interval = PROBLEM_MODEL_REVALIDATE_INTERVAL
+    url = PROBLEM_MODELS_URL
+
+    _difficulties: Optional[ProblemDifficulties] = None
+    _meta: Optional[ProblemModelMeta] = None
+    _flight = SingleFlight()
+
+    @classmethod
+    async def fetch_difficulties(cls) -> ProblemDifficulties:
+        return await cls._flight.do("problem_models", cls._fetch_difficulties)
+
+    @classmethod
+    async def fetch_models(cls) -> dict[str, dict]:
+        await cls.fetch_difficulties()
+        content = cls._read(cls._path("problem-models.json"))
+        if content is None:
+            # 保存できない環境では毎回取得する
+            res = await UpstreamClient.get(cls.url)
+            res.raise_for_status()
+            content = res.content
+        return json.loads(content)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._difficulties = None
+        cls._meta = None
+
+    @classmethod
+    async def _fetch_difficulties(cls) -> ProblemDifficulties:
+        if cls._difficulties is None:
+            cls._meta = cls._load_meta()
+            if cls._meta is not None:
+                cls._difficulties = ProblemDifficulties.load(
+                    cls._path("problem_ids.txt"), cls._path("difficulties.bin")
+                )
+                if cls._difficulties is None or len(cls._difficulties) != cls._meta.count:
+                    cls._difficulties, cls._meta = None, None
+
+        meta, difficulties = cls._meta, cls._difficulties
+        if (
+            meta is not None
+            and difficulties is not None
+            and time.time() - meta.checked_at < cls.revalidate_interval
+        ):
+            return difficulties
+
+        headers = {}
+        if meta is not None and difficulties is not None:
+            if meta.etag:
+                headers["If-None-Match"] = meta.etag
+            if meta.last_modified:
+                headers["If-Modified-Since"] = meta.last_modified
+
+        try:
+            res = await UpstreamClient.get(cls.url, headers=headers)
+            if res.status_code == httpx.codes.NOT_MODIFIED:
+                if meta is not None and difficulties is not None:
+                    meta.checked_at = time.time()
+                    cls._save_meta(meta)
+                    return difficulties
+                # 比べる手元のデータがないので、条件なしで取り直す
+                res = await UpstreamClient.get(cls.url)
+            res.raise_for_status()
+        except Exception:
+            if difficulties is None:
+                raise
+            # 取得できなければ手元のデータを使い続ける
+            logger.warning("failed to revalidate problem models", exc_info=True)
+            return difficulties
+
+        models: dict[str, dict] = json.loads(res.content)
+        difficulties = ProblemDifficulties.from_models(models)
+        meta = ProblemModelMeta(
+            etag=res.headers.get("ETag"),
+            last_modified=res.headers.get("Last-Modified"),
+            checked_at=time.time(),
+            count=len(difficulties),
+        )
+        cls._save(res.content, difficulties, meta)
+        cls._difficulties, cls._meta = difficulties, meta
+        return difficulties
+
+    @classmethod
+    def _load_meta(cls) -> Optional[ProblemModelMeta]:
+        content = cls._read(cls._path("meta.json"))
+        if content is None:
+            return None
+        try:
+            meta = ProblemModelMeta.model_validate_json(content)
+        except ValueError:
+            return None
+        return meta if meta.version == STORE_VERSION else None
+
+    @classmethod
+    def _save(cls, content: bytes, difficulties: ProblemDifficulties, meta: ProblemModelMeta) -> None:
+        cls._write("problem-models.json", lambda f: f.write(content))
+        cls._write("difficulties.bin", lambda f: f.write(difficulties.difficulties_bytes()))
+        cls._write("problem_ids.txt", lambda f: f.write(difficulties.ids_bytes()))
+        # meta は最後に書く (途中で失敗したら件数の不一致で読み捨てられる)
+        cls._save_meta(meta)
+
+    @classmethod
+    def _save_meta(cls, meta: ProblemModelMeta) -> None:
+        cls._write("meta.json", lambda f: f.write(meta.model_dump_json().encode()))
+
+    @classmethod
+    def _write(cls, name: str, write: Callable[[BinaryIO], Any]) -> None:
+        write_atomic(cls._path(name), write)
+
+    @classmethod
+    def _read(cls, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    @classmethod
+    def _path(cls, name: str) -> str:
+        return os.path.join(cls.directory, name)
@@ -0,0 +1,122 @@
+from typing import Any, Optional, Iterable, List, BinaryIO
+import os
+import re
+import sys
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.config import SUBMISSION_STORE_DIR
+from src.submission_table import SubmissionTable
+from src.utils import write_atomic
+
+# ファイルの形式を変えたら上げる (バージョンが違うファイルは取得し直す)
+STORE_VERSION = 3
+
+# ジャッジ待ちの提出は結果が後から変わるので再取得の対象にする
+PENDING_RESULTS = {"WJ", "WR"}
+
+USERNAME_PATTERN = re.compile(r"[A-Za-z0-9_]{1,32}")
+
+
+class StoredSubmissions(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    version: int = STORE_VERSION
+    user_id: str
+    # この時刻以降の提出はすべて取得済み
+    from_second: int = 0
+    last_epoch_second: int = 0
+    last_id: int = 0
+    # (epoch_second, id) 順
+    table: SubmissionTable = Field(default_factory=SubmissionTable)
+
+    def resume_second(self) -> int:
+        # 最後に取得した秒から取り直し、同じ秒に後から来た提出も拾う
+        resume = self.last_epoch_second
+        pending = self.table.pending_index(PENDING_RESULTS)
+        if pending is not None:
+            resume = min(resume, self.table.epoch_seconds[pending])
+        return max(resume, self.from_second)
+
+    def merge(self, rows: Iterable[Any]) -> None:
+        self.table = self.table.merge(rows)
+        if len(self.table):
+            self.last_epoch_second = self.table.epoch_seconds[-1]
+            self.last_id = max(self.last_id, max(self.table.ids))
+
+
+# 保存するファイルの1行目 (JSON)。2行目以降は SubmissionTable の列をつなげたバイト列
+class StoredHeader(BaseModel):
+    version: int
+    user_id: str
+    from_second: int
+    last_epoch_second: int
+    last_id: int
+    count: int
+    byteorder: str
+    strings: dict[str, List[str]]
+
+
+# pickle は使わない (共有のディレクトリに置かれたファイルを読んでもコードは実行されない)
+class SubmissionStore:
+    directory = SUBMISSION_STORE_DIR
+
+    @classmethod
+    def load(cls, user_id: str) -> Optional[StoredSubmissions]:
+        path = cls._path(user_id)
+        if path is None or not os.path.exists(path):
+            return None
+
+        # 壊れたファイル・古い形式のファイルは、ないものとして取得し直す
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            line, _, data = content.partition(b"\n")
+            header = StoredHeader.model_validate_json(line)
+            if (
+                header.version != STORE_VERSION
+                or header.user_id != user_id
+                or header.byteorder != sys.byteorder
+            ):
+                return None
+            table = SubmissionTable.from_columns(user_id, header.strings, data, header.count)
+        except Exception:
+            return None
+
+        return StoredSubmissions(
+            user_id=user_id,
+            from_second=header.from_second,
+            last_epoch_second=header.last_epoch_second,
+            last_id=header.last_id,
+            table=table,
+        )
+
+    @classmethod
+    def save(cls, stored: StoredSubmissions) -> None:
+        path = cls._path(stored.user_id)
+        if path is None:
+            return
+
+        header = StoredHeader(
+            version=STORE_VERSION,
+            user_id=stored.user_id,
+            from_second=stored.from_second,
+            last_epoch_second=stored.last_epoch_second,
+            last_id=stored.last_id,
+            count=len(stored.table),
+            byteorder=sys.byteorder,
+            strings=stored.table.string_tables(),
+        )
+
+        def write(f: BinaryIO) -> None:
+            f.write(header.model_dump_json().encode())
+            f.write(b"\n")
+            f.write(stored.table.columns_bytes())
+
+        write_atomic(path, write)
+
+    @classmethod
+    def _path(cls, user_id: str) -> Optional[str]:
+        if not USERNAME_PATTERN.fullmatch(user_id):
+            return None
+        return os.path.join(cls.directory, f"{user_id}.bin")
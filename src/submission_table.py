@@ -0,0 +1,323 @@
+from typing import Optional, Callable, Iterable, Iterator, List, Any
+from array import array
+import bisect
+import hashlib
+
+
+# 同じ文字列 (問題ID・言語など) を1つだけ持ち、列にはインデックスを入れる
+class StringTable:
+    def __init__(self) -> None:
+        self.values: List[str] = []
+        self._index: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def intern(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = len(self.values)
+            self.values.append(value)
+            self._index[value] = index
+        return index
+
+    def get(self, value: str) -> Optional[int]:
+        return self._index.get(value)
+
+    @classmethod
+    def from_values(cls, values: List[str]) -> "StringTable":
+        table = cls()
+        table.__setstate__(list(values))
+        return table
+
+    def __getstate__(self) -> List[str]:
+        return self.values
+
+    def __setstate__(self, values: List[str]) -> None:
+        self.values = values
+        self._index = {v: i for i, v in enumerate(values)}
+
+
+# SubmissionTable の1行分のビュー (Submission と同じ属性名で読める)
+class SubmissionRow:
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "SubmissionTable", index: int) -> None:
+        self._table = table
+        self._index = index
+
+    @property
+    def id(self) -> int:
+        return self._table.ids[self._index]
+
+    @property
+    def epoch_second(self) -> int:
+        return self._table.epoch_seconds[self._index]
+
+    @property
+    def problem_id(self) -> str:
+        return self._table.problems.values[self._table.problem_codes[self._index]]
+
+    @property
+    def contest_id(self) -> str:
+        return self._table.contests.values[self._table.contest_codes[self._index]]
+
+    @property
+    def user_id(self) -> str:
+        return self._table.user_id
+
+    @property
+    def language(self) -> str:
+        return self._table.languages.values[self._table.language_codes[self._index]]
+
+    @property
+    def point(self) -> float:
+        return self._table.points[self._index]
+
+    @property
+    def length(self) -> int:
+        return self._table.lengths[self._index]
+
+    @property
+    def result(self) -> str:
+        return self._table.results.values[self._table.result_codes[self._index]]
+
+    @property
+    def execution_time(self) -> Optional[int]:
+        execution_time = self._table.execution_times[self._index]
+        return None if execution_time < 0 else execution_time
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "epoch_second": self.epoch_second,
+            "problem_id": self.problem_id,
+            "contest_id": self.contest_id,
+            "user_id": self.user_id,
+            "language": self.language,
+            "point": self.point,
+            "length": self.length,
+            "result": self.result,
+            "execution_time": self.execution_time,
+        }
+
+
+# 1ユーザー分の提出を列ごとの配列で持つ
+# 行 (epoch_second, id) 順に並んでいる前提
+class SubmissionTable:
+    def __init__(self, user_id: str = "") -> None:
+        self.user_id = user_id
+
+        self.ids = array("q")
+        self.epoch_seconds = array("q")
+        self.lengths = array("q")
+        self.points = array("d")
+        # 実行時間がない (CE 等) 場合は -1
+        self.execution_times = array("q")
+
+        self.problems = StringTable()
+        self.contests = StringTable()
+        self.languages = StringTable()
+        self.results = StringTable()
+
+        self.problem_codes = array("I")
+        self.contest_codes = array("I")
+        self.language_codes = array("I")
+        # 結果の種類は少ないので 1 byte
+        self.result_codes = array("B")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], user_id: str = "") -> "SubmissionTable":
+        table = cls(user_id)
+        for row in sorted(rows, key=_sort_key):
+            table.append(row)
+        return table
+
+    @classmethod
+    def from_columns(
+        cls, user_id: str, strings: dict[str, List[str]], data: bytes, count: int
+    ) -> "SubmissionTable":
+        # columns_bytes で書き出した列と文字列表から作る
+        # 長さやインデックスが合わないもの (壊れたファイル) は ValueError
+        table = cls(user_id)
+        for name in _STRING_TABLES:
+            setattr(table, name, StringTable.from_values(strings[name]))
+
+        offset = 0
+        for name in _COLUMNS:
+            column = getattr(table, name)
+            size = count * column.itemsize
+            column.frombytes(data[offset : offset + size])
+            if len(column) != count:
+                raise ValueError("truncated column", name)
+            offset += size
+        if offset != len(data):
+            raise ValueError("trailing data")
+
+        for codes, name in _CODES:
+            if count and max(getattr(table, codes)) >= len(getattr(table, name)):
+                raise ValueError("string index out of range", name)
+        return table
+
+    def string_tables(self) -> dict[str, List[str]]:
+        return {name: getattr(self, name).values for name in _STRING_TABLES}
+
+    def columns_bytes(self) -> bytes:
+        # 列をつなげたもの (ネイティブのバイトオーダー)
+        return b"".join(getattr(self, name).tobytes() for name in _COLUMNS)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[SubmissionRow]:
+        return (SubmissionRow(self, i) for i in range(len(self.ids)))
+
+    def __getitem__(self, index: int) -> SubmissionRow:
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError("submission index out of range")
+        return SubmissionRow(self, index)
+
+    def append(self, row: Any) -> None:
+        # row は API のレスポンス (dict) か Submission
+        get: Callable[[str], Any] = row.get if isinstance(row, dict) else row.__getattribute__
+        if not self.user_id:
+            self.user_id = get("user_id")
+
+        execution_time = get("execution_time")
+        self.ids.append(get("id"))
+        self.epoch_seconds.append(get("epoch_second"))
+        self.lengths.append(get("length"))
+        self.points.append(get("point"))
+        self.execution_times.append(-1 if execution_time is None else execution_time)
+        self.problem_codes.append(self.problems.intern(get("problem_id")))
+        self.contest_codes.append(self.contests.intern(get("contest_id")))
+        self.language_codes.append(self.languages.intern(get("language")))
+        self.result_codes.append(self.results.intern(get("result")))
+
+    def to_dicts(self) -> List[dict[str, Any]]:
+        # 列から直接 dict を作る (SubmissionRow.to_dict を行ごとに呼ぶより速い)
+        problems, contests = self.problems.values, self.contests.values
+        languages, results = self.languages.values, self.results.values
+        user_id = self.user_id
+        return [
+            {
+                "id": id,
+                "epoch_second": epoch_second,
+                "problem_id": problems[problem],
+                "contest_id": contests[contest],
+                "user_id": user_id,
+                "language": languages[language],
+                "point": point,
+                "length": length,
+                "result": results[result],
+                "execution_time": None if execution_time < 0 else execution_time,
+            }
+            for id, epoch_second, problem, contest, language, point, length, result, execution_time in zip(
+                self.ids,
+                self.epoch_seconds,
+                self.problem_codes,
+                self.contest_codes,
+                self.language_codes,
+                self.points,
+                self.lengths,
+                self.result_codes,
+                self.execution_times,
+            )
+        ]
+
+    def problem_ids(self) -> Iterator[str]:
+        values = self.problems.values
+        return (values[code] for code in self.problem_codes)
+
+    def result_values(self) -> Iterator[str]:
+        values = self.results.values
+        return (values[code] for code in self.result_codes)
+
+    def fingerprint(self) -> str:
+        # 中身が同じなら同じ値になるハッシュ (ETag 用)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.user_id.encode())
+        for name in _COLUMNS:
+            h.update(getattr(self, name).tobytes())
+        for strings in (self.problems, self.contests, self.languages, self.results):
+            h.update("\0".join(strings.values).encode())
+            h.update(b"\1")
+        return h.hexdigest()
+
+    def bisect(self, epoch_second: int) -> int:
+        return bisect.bisect_left(self.epoch_seconds, epoch_second)
+
+    def since(self, epoch_second: int) -> "SubmissionTable":
+        # epoch_second 以降の行だけを持つテーブル (文字列表は共有する)
+        start = self.bisect(epoch_second)
+        if start == 0:
+            return self
+
+        table = SubmissionTable(self.user_id)
+        table.problems, table.contests = self.problems, self.contests
+        table.languages, table.results = self.languages, self.results
+        for name in _COLUMNS:
+            setattr(table, name, getattr(self, name)[start:])
+        return table
+
+    def merge(self, rows: Iterable[Any]) -> "SubmissionTable":
+        # 同じ id の行は新しいもので置き換える
+        # 差分より前の行はそのまま残し、差分と重なる末尾だけを並べ直す
+        rows = sorted(rows, key=_sort_key)
+        if not rows:
+            return self
+
+        replaced = {_get(row, "id") for row in rows}
+        start = self.bisect(_get(rows[0], "epoch_second"))
+        tail = [
+            SubmissionRow(self, i).to_dict()
+            for i in range(start, len(self))
+            if self.ids[i] not in replaced
+        ]
+        for name in _COLUMNS:
+            del getattr(self, name)[start:]
+
+        for row in sorted(tail + rows, key=_sort_key):
+            self.append(row)
+        return self
+
+    def pending_index(self, results: Iterable[str]) -> Optional[int]:
+        # 最初に results のいずれかである行
+        codes = {self.results.get(r) for r in results} - {None}
+        for i, code in enumerate(self.result_codes):
+            if code in codes:
+                return i
+        return None
+
+
+_COLUMNS = [
+    "ids",
+    "epoch_seconds",
+    "lengths",
+    "points",
+    "execution_times",
+    "problem_codes",
+    "contest_codes",
+    "language_codes",
+    "result_codes",
+]
+
+_STRING_TABLES = ["problems", "contests", "languages", "results"]
+
+# (インデックスの列, 文字列表)
+_CODES = [
+    ("problem_codes", "problems"),
+    ("contest_codes", "contests"),
+    ("language_codes", "languages"),
+    ("result_codes", "results"),
+]
+
+
+def _get(row: Any, key: str) -> Any:
+    return row[key] if isinstance(row, dict) else getattr(row, key)
+
+
+def _sort_key(row: Any) -> tuple[int, int]:
+    return _get(row, "epoch_second"), _get(row, "id")
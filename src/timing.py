@@ -0,0 +1,155 @@
+from typing import Any, Awaitable, Callable, Iterator, List, Optional, TypeVar
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import inspect
+import logging
+import time
+
+from src.tracing import span, Scope, Receive, Send, Message
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# リクエストの処理 (取得・解析・描画) ごとにかかった時間
+# Server-Timing ヘッダーで返し、フックにも渡す
+
+
+class Timings:
+    def __init__(self) -> None:
+        # (名前, 秒) を記録した順に持つ。同じ名前が複数回出てくることもある
+        self.phases: List[tuple[str, float]] = []
+        # ミドルウェアが設定する (マッチしたルートのテンプレートとステータスコード)
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases.append((name, seconds))
+
+    def totals(self) -> dict[str, float]:
+        # 名前ごとの合計 (最初に出てきた順)
+        totals: dict[str, float] = {}
+        for name, seconds in self.phases:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self) -> str:
+        # ex: "profile;dur=120.5, render;dur=0.8"
+        return ", ".join(
+            f"{name};dur={seconds * 1e3:.1f}" for name, seconds in self.totals().items()
+        )
+
+
+# (ルートのパス, 計測結果) を受け取る。レスポンスを返した後に呼ばれる
+Hook = Callable[[str, Timings], None]
+
+_current: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+_hooks: List[Hook] = []
+
+
+def current() -> Optional[Timings]:
+    return _current.get()
+
+
+def add_hook(hook: Hook) -> None:
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Hook) -> None:
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+@contextmanager
+def collect() -> Iterator[Timings]:
+    # この中 (と、ここから作られたタスク) で計測した時間を集める
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    # トレース中ならスパンとしても記録する
+    with span(name):
+        # 計測中のリクエストがなければ何もしない
+        timings = _current.get()
+        if timings is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings.add(name, time.perf_counter() - start)
+
+
+def timed(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    # 関数全体を phase で囲む (async 関数なら await し終わるまで)
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with phase(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with phase(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def slow_request_logger(threshold: float) -> Hook:
+    # 合計が threshold 秒を超えたリクエストの内訳をログに出すフック
+    def hook(path: str, timings: Timings) -> None:
+        if timings.totals().get("total", 0.0) > threshold:
+            logger.warning("slow request %s: %s", path, timings.server_timing())
+
+    return hook
+
+
+class ServerTimingMiddleware:
+    # 各リクエストの計測結果を Server-Timing ヘッダーに付けて、フックに渡す
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        with collect() as timings:
+
+            async def send_with_timing(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    timings.add("total", time.perf_counter() - start)
+                    timings.status = message["status"]
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing().encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+        route = scope.get("route")
+        timings.route = getattr(route, "path", None)
+        if _hooks:
+            path = timings.route or scope.get("path", "")
+            for hook in list(_hooks):
+                try:
+                    hook(path, timings)
+                except Exception:
+                    logger.warning("timing hook failed", exc_info=True)
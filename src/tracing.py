@@ -0,0 +1,175 @@
+from typing import Any, Awaitable, Callable, Iterator, List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+import json
+import logging
+import os
+import random
+import time
+
+Scope = dict[str, Any]
+Message = dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+# 1リクエストの中の処理 (ハンドラ・上流への通信・解析・描画) をスパンとして記録する
+# 一定の割合のリクエストと、遅かったリクエストだけを JSONL に書き出す
+
+
+class Span:
+    __slots__ = ("id", "parent", "name", "start", "end", "attributes")
+
+    def __init__(
+        self, id: int, parent: Optional[int], name: str, start: float, attributes: dict[str, Any]
+    ) -> None:
+        self.id = id
+        self.parent = parent
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes
+
+
+class Trace:
+    def __init__(self) -> None:
+        self.trace_id = os.urandom(8).hex()
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+
+    def start_span(self, name: str, parent: Optional[int], attributes: dict[str, Any]) -> Span:
+        span = Span(len(self.spans), parent, name, time.perf_counter(), attributes)
+        self.spans.append(span)
+        return span
+
+    def to_dict(self, **fields: Any) -> dict[str, Any]:
+        # 時間はリクエストの開始からのミリ秒
+        def ms(t: float) -> float:
+            return round((t - self.start) * 1e3, 3)
+
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            **fields,
+            "spans": [
+                {
+                    "id": s.id,
+                    "parent": s.parent,
+                    "name": s.name,
+                    "start_ms": ms(s.start),
+                    # 書き出す時点で終わっていないもの (裏で続いている取得など) は null
+                    "duration_ms": round((s.end - s.start) * 1e3, 3) if s.end else None,
+                    **({"attributes": s.attributes} if s.attributes else {}),
+                }
+                for s in self.spans
+            ],
+        }
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_parent: ContextVar[Optional[int]] = ContextVar("span_parent", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    # トレース中でなければ何もしない (None を返す)
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+
+    s = trace.start_span(name, _parent.get(), attributes)
+    token = _parent.set(s.id)
+    try:
+        yield s
+    except BaseException as e:
+        s.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        s.end = time.perf_counter()
+
+
+Sink = Callable[[dict[str, Any]], None]
+
+
+def jsonl_sink(path: str, max_bytes: int, backup_count: int) -> Sink:
+    # 1トレース1行。max_bytes を超えたら path.1, path.2, ... にずらす
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger = logging.getLogger(f"{__name__}.{path}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    # 同じパスで作り直したときに二重に書かないように
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+        old.close()
+    logger.addHandler(handler)
+
+    def write(record: dict[str, Any]) -> None:
+        logger.info(json.dumps(record, separators=(",", ":"), default=str))
+
+    return write
+
+
+class TracingMiddleware:
+    # sample_rate の割合のリクエストと、slow_threshold 秒以上かかったリクエストを sink に渡す
+    def __init__(
+        self,
+        app: Callable[..., Any],
+        sink: Sink,
+        sample_rate: float = 0.0,
+        slow_threshold: float = 0.0,
+    ) -> None:
+        self.app = app
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        status: Optional[int] = None
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _trace.set(trace)
+        try:
+            with span("handler", method=scope["method"], path=scope["path"]):
+                await self.app(scope, receive, send_with_status)
+        finally:
+            _trace.reset(token)
+            self._finish(trace, scope, status)
+
+    def _finish(self, trace: Trace, scope: Scope, status: Optional[int]) -> None:
+        duration = time.perf_counter() - trace.start
+        if self.slow_threshold > 0 and duration >= self.slow_threshold:
+            reason = "slow"
+        elif random.random() < self.sample_rate:
+            reason = "sampled"
+        else:
+            return
+
+        route = scope.get("route")
+        record = trace.to_dict(
+            route=getattr(route, "path", None),
+            path=scope["path"],
+            status=status,
+            duration_ms=round(duration * 1e3, 3),
+            reason=reason,
+        )
+        try:
+            self.sink(record)
+        except Exception:
+            logging.getLogger(__name__).warning("failed to write trace", exc_info=True)
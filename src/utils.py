@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
-from typing import Iterable
+from typing import Any, BinaryIO, Callable, Iterable
+import os
+import tempfile
 
 
 def get_rating_color(rating: int) -> str:
@@ -27,3 +29,23 @@ def date_range(start: datetime, end: datetime, step: timedelta = timedelta(days=
     while current < end:
         yield current
         current += step
+
+
+def write_atomic(path: str, write: Callable[[BinaryIO], Any]) -> None:
+    # 書き込み途中のファイルを読まないように、同じディレクトリの一時ファイルから置き換える
+    # ディレクトリは他のユーザーから読み書きできないように作る
+    # キャッシュ用なので、書けなかった場合は何もしない
+    directory = os.path.dirname(path) or "."
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
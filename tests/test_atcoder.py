@@ -1,12 +1,15 @@
-from unittest import mock
 import datetime
 from typing import List
 import json
+import asyncio
+import time
 
 import pytest
-from requests import Response
+from httpx import Response
 
 from src.atcoder import Atcoder as atcoder, Competition, UserData
+from src.client import run_sync
+from tests.utils import mock_upstream, AsyncChunks
 
 
 class TestAtcoder:
@@ -125,13 +128,8 @@ class TestAtcoder:
         with open("tests/html/profile.html", "r", encoding="utf-8") as pr:
             profile = "".join(pr.readlines())
 
-            with mock.patch("requests.get") as rget_mock:
-                pr_res = Response()
-                pr_res.__setattr__("_content", profile)
-                pr_res.__setattr__("status_code", 200)
-
-                rget_mock.return_value = pr_res
-                userdata = atcoder.fetch_userdata("iwbc_mzk")
+            with mock_upstream(lambda request: Response(200, text=profile)):
+                userdata = atcoder.fetch_userdata_sync("iwbc_mzk")
 
         valid_userdata = self._userdata.model_copy()
         valid_userdata.competitions_history = []
@@ -144,28 +142,98 @@ class TestAtcoder:
             profile = "".join(pr.readlines())
             compe = "".join(ch.readlines())
 
-            with mock.patch("requests.get") as rget_mock:
-                pr_res = Response()
-                pr_res.__setattr__("_content", profile)
-                pr_res.__setattr__("status_code", 200)
-
-                ch_res = Response()
-                ch_res.__setattr__("_content", compe)
-                ch_res.__setattr__("status_code", 200)
-
-                rget_mock.side_effect = [pr_res, ch_res]
-                userdata = atcoder.fetch_userdata("iwbc_mzk", need_compe=True)
+            with mock_upstream(
+                lambda request: Response(200, text=compe)
+                if request.url.path.endswith("/history/json")
+                else Response(200, text=profile)
+            ):
+                userdata = atcoder.fetch_userdata_sync("iwbc_mzk", need_compe=True)
 
         self._check_userdata(userdata, self._userdata)
 
     def test_fetch_userdata_ng(self):
         # Invalid user name
-        with mock.patch("requests.get") as rget_mock:
-            res = Response()
-            res.__setattr__("status_code", 404)
-            rget_mock.return_value = res
+        with mock_upstream(lambda request: Response(404)):
+            with pytest.raises(ValueError) as e:
+                atcoder.fetch_userdata_sync("iwbc_mzk")
+            assert e.value.args == (
+                "User Name Not Found.",
+                "Please make sure username is correct.",
+            )
+
+    def test_fetch_userdata_with_history_ng(self):
+        with open("tests/html/profile.html", "r", encoding="utf-8") as pr:
+            profile = "".join(pr.readlines())
+
+        # History fetch fails
+        with mock_upstream(
+            lambda request: Response(404)
+            if request.url.path.endswith("/history/json")
+            else Response(200, text=profile)
+        ):
+            with pytest.raises(ValueError) as e:
+                atcoder.fetch_userdata_sync("iwbc_mzk", need_compe=True)
+            assert e.value.args == ("User Name Not Found.", "")
+
+        # Both fail: the profile error wins
+        async def both_fail(request):
+            if request.url.path.endswith("/history/json"):
+                await asyncio.sleep(0.01)
+            return Response(404)
+
+        with mock_upstream(both_fail):
             with pytest.raises(ValueError) as e:
-                atcoder.fetch_userdata("iwbc_mzk")
+                atcoder.fetch_userdata_sync("iwbc_mzk", need_compe=True)
+            assert e.value.args == (
+                "User Name Not Found.",
+                "Please make sure username is correct.",
+            )
+
+    def test_fetch_userdata_history_ng_does_not_wait(self):
+        # 履歴の取得に失敗したら、プロフィールの取得を待たずに返す
+        async def handler(request):
+            if request.url.path.endswith("/history/json"):
+                return Response(404)
+            await asyncio.sleep(1)
+            return Response(200, text="")
+
+        start = time.perf_counter()
+        with mock_upstream(handler):
+            with pytest.raises(ValueError) as e:
+                atcoder.fetch_userdata_sync("iwbc_mzk", need_compe=True)
+        assert e.value.args == ("User Name Not Found.", "")
+        assert time.perf_counter() - start < 0.5
+
+    def test_fetch_userdata_without_rank(self):
+        with open("tests/json/competition_history.json", "r", encoding="utf-8") as ch:
+            compe = "".join(ch.readlines())
+
+        requested = []
+
+        def handler(request):
+            requested.append(request.url.path)
+            return Response(200, text=compe)
+
+        with mock_upstream(handler):
+            userdata = atcoder.fetch_userdata_sync(
+                "iwbc_mzk", need_compe=True, need_rank=False
+            )
+
+        # HTML は取得しない
+        assert requested == ["/users/iwbc_mzk/history/json"]
+        assert userdata.rank is None
+        assert userdata.rating == 772
+        assert userdata.highest_rating == 789
+        assert userdata.rated_matches == 3
+        assert userdata.last_competed == datetime.datetime(2023, 6, 24)
+        self._check_competition_history(
+            userdata.competitions_history, self._userdata.competitions_history
+        )
+
+        # Invalid user name
+        with mock_upstream(lambda request: Response(404)):
+            with pytest.raises(ValueError) as e:
+                atcoder.fetch_userdata_sync("iwbc_mzk", need_rank=False)
             assert e.value.args == (
                 "User Name Not Found.",
                 "Please make sure username is correct.",
@@ -175,12 +243,8 @@ class TestAtcoder:
         with open("tests/html/profile.html", "r", encoding="utf-8") as f:
             content = "".join(f.readlines())
 
-            with mock.patch("requests.get") as rget_mock:
-                res = Response()
-                res.__setattr__("_content", content)
-                res.__setattr__("status_code", 200)
-                rget_mock.return_value = res
-                profile = atcoder.fetch_profile("iwbc_mzk")
+            with mock_upstream(lambda request: Response(200, text=content)):
+                profile = atcoder.fetch_profile_sync("iwbc_mzk")
 
         profile = profile.model_dump()
         userdata = self._userdata.model_dump()
@@ -190,36 +254,79 @@ class TestAtcoder:
 
     def test_fetch_profile_ng(self):
         # Invalid user name
-        with mock.patch("requests.get") as rget_mock:
-            res = Response()
-            res.__setattr__("status_code", 404)
-            rget_mock.return_value = res
+        with mock_upstream(lambda request: Response(404)):
             with pytest.raises(ValueError) as e:
-                atcoder.fetch_profile("iwbc_mzk")
+                atcoder.fetch_profile_sync("iwbc_mzk")
             assert e.value.args == (
                 "User Name Not Found.",
                 "Please make sure username is correct.",
             )
 
+    def test_fetch_profile_stops_after_table(self):
+        with open("tests/html/profile.html", "rb") as f:
+            content = f.read()
+        table_end = content.index(b"</table>", content.index(b"Last Competed"))
+        sent = []
+
+        async def body():
+            # テーブルまでを1チャンク、残りは大きなフッターとして送る
+            for chunk in [content[: table_end + 8]] + [b"<div>footer</div>" * 1000] * 50:
+                sent.append(len(chunk))
+                yield chunk
+
+        with mock_upstream(lambda request: Response(200, content=body())):
+            profile = atcoder.fetch_profile_sync("iwbc_mzk")
+
+        assert profile.rank == self._userdata.rank
+        assert profile.last_competed == self._userdata.last_competed
+        assert len(sent) < 50
+
+    def test_fetch_profile_single_flight(self):
+        with open("tests/html/profile.html", "r", encoding="utf-8") as f:
+            content = f.read()
+        requested = []
+
+        async def handler(request):
+            requested.append(request.url.path)
+            await asyncio.sleep(0.01)
+            return Response(200, text=content)
+
+        async def fetch_all():
+            return await asyncio.gather(
+                *[atcoder.fetch_profile("iwbc_mzk") for _ in range(5)]
+            )
+
+        with mock_upstream(handler):
+            profiles = run_sync(fetch_all())
+
+        assert requested == ["/users/iwbc_mzk"]
+        assert all(p.rank == self._userdata.rank for p in profiles)
+
+    def test_parse_profile_unrated(self):
+        content = b"""
+            <table class="dl-table"><tr><th>Country/Region</th><td>Japan</td></tr></table>
+            <p>This user has not yet participated in rated contests.</p>
+        """
+        chunks = AsyncChunks(content, atcoder.parse_chunk_size)
+        profile = run_sync(atcoder._parse_profile("iwbc_mzk", chunks))
+        assert profile.rank is None
+        assert profile.rating is None
+        assert profile.highest_rating is None
+        assert profile.rated_matches == 0
+        assert profile.last_competed is None
+
     def test_fetch_competition_history_ok(self):
         with open("tests/json/competition_history.json", "r", encoding="utf-8") as f:
             content = "".join(f.readlines())
 
-            with mock.patch("requests.get") as rget_mock:
-                res = Response()
-                res.__setattr__("_content", content)
-                res.__setattr__("status_code", 200)
-                rget_mock.return_value = res
-                histories = atcoder.fetch_competition_histry("iwbc_mzk")
+            with mock_upstream(lambda request: Response(200, text=content)):
+                histories = atcoder.fetch_competition_histry_sync("iwbc_mzk")
 
         self._check_competition_history(histories, self._userdata.competitions_history)
 
     def test_fetch_competition_history_ng(self):
         # Invalid user name
-        with mock.patch("requests.get") as rget_mock:
-            res = Response()
-            res.__setattr__("status_code", 404)
-            rget_mock.return_value = res
+        with mock_upstream(lambda request: Response(404)):
             with pytest.raises(ValueError) as e:
-                atcoder.fetch_competition_histry("iwbc_mzk")
+                atcoder.fetch_competition_histry_sync("iwbc_mzk")
             assert e.value.args == ("User Name Not Found.", "")
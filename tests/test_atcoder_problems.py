@@ -0,0 +1,314 @@
+from unittest import mock
+from urllib.parse import urlsplit, parse_qs
+import json
+
+import pytest
+from httpx import Response, Request, HTTPStatusError
+from pydantic import ValidationError
+
+from src.atcoder_problems import AtcoderProblems as ap, Submission, ProblemModel
+from src.problem_model_store import ProblemModelStore, ProblemDifficulties
+from src.submission_store import SubmissionStore, StoredSubmissions
+from src.submission_table import SubmissionTable
+from tests.utils import mock_upstream
+
+
+def make_row(id: int, epoch_second: int, result: str = "AC") -> dict:
+    return {
+        "id": id,
+        "epoch_second": epoch_second,
+        "problem_id": f"abc315_{id % 7}",
+        "contest_id": "abc315",
+        "user_id": "iwbc_mzk",
+        "language": "Python (PyPy 3.10-v7.3.12)",
+        "point": 100.0,
+        "length": 262,
+        "result": result,
+        "execution_time": 55,
+    }
+
+
+class FakeSubmissionsAPI:
+    def __init__(self, rows: list[dict]) -> None:
+        self.rows = rows
+        self.requested_from: list[int] = []
+
+    async def get(self, url: str) -> Response:
+        query = parse_qs(urlsplit(url).query)
+        from_second = int(query["from_second"][0])
+        self.requested_from.append(from_second)
+
+        rows = [r for r in self.rows if r["epoch_second"] >= from_second][:500]
+        return Response(200, text=json.dumps(rows))
+
+
+class TestAtcoderProblems:
+    @pytest.fixture(autouse=True)
+    def store_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(SubmissionStore, "directory", str(tmp_path))
+
+    def test_fetch_submissions_paging(self):
+        api = FakeSubmissionsAPI([make_row(i, 1000 + i) for i in range(1200)])
+        with mock.patch("src.client.UpstreamClient.get", side_effect=api.get):
+            submissions = ap.fetch_submissions_sync("iwbc_mzk")
+
+        assert len(api.requested_from) == 3
+        assert len(submissions) == 1200
+        assert all(isinstance(s, Submission) for s in submissions)
+        assert [s.id for s in submissions] == list(range(1200))
+
+    def test_fetch_submissions_incremental(self):
+        api = FakeSubmissionsAPI([make_row(i, 1000 + i) for i in range(1200)])
+        with mock.patch("src.client.UpstreamClient.get", side_effect=api.get):
+            ap.fetch_submissions_sync("iwbc_mzk")
+
+            # 2回目以降は差分だけを1回で取得する
+            api.requested_from.clear()
+            api.rows.append(make_row(1200, 2199))
+            api.rows.append(make_row(1201, 2300))
+            submissions = ap.fetch_submissions_sync("iwbc_mzk")
+
+        assert api.requested_from == [2199]
+        assert len(submissions) == 1202
+        assert submissions[-1].id == 1201
+
+        stored = SubmissionStore.load("iwbc_mzk")
+        assert stored is not None
+        assert stored.last_epoch_second == 2300
+        assert stored.last_id == 1201
+
+    def test_fetch_submissions_refetch_pending(self):
+        api = FakeSubmissionsAPI([make_row(1, 1000), make_row(2, 1500, "WJ"), make_row(3, 2000)])
+        with mock.patch("src.client.UpstreamClient.get", side_effect=api.get):
+            ap.fetch_submissions_sync("iwbc_mzk")
+
+            api.requested_from.clear()
+            api.rows[1] = make_row(2, 1500, "AC")
+            submissions = ap.fetch_submissions_sync("iwbc_mzk")
+
+        assert api.requested_from == [1500]
+        assert [s.result for s in submissions] == ["AC", "AC", "AC"]
+
+    def test_fetch_submissions_ng(self):
+        with mock.patch("src.client.UpstreamClient.get") as get_mock:
+            get_mock.return_value = Response(
+                500, request=Request("GET", ap._get_submissions_url("iwbc_mzk", 0))
+            )
+            with pytest.raises(HTTPStatusError):
+                ap.fetch_submissions_sync("iwbc_mzk")
+
+        assert SubmissionStore.load("iwbc_mzk") is None
+
+    def test_fetch_submissions_window(self):
+        api = FakeSubmissionsAPI([make_row(i, 1000 + i) for i in range(1200)])
+        with mock.patch("src.client.UpstreamClient.get", side_effect=api.get):
+            submissions = ap.fetch_submissions_sync("iwbc_mzk", from_unix_second=2000)
+
+            assert api.requested_from == [2000]
+            assert [s.epoch_second for s in submissions] == list(range(2000, 2200))
+
+            # 保存済みの範囲より前が必要になったら取り直す
+            api.requested_from.clear()
+            submissions = ap.fetch_submissions_sync("iwbc_mzk", from_unix_second=1900)
+
+        assert api.requested_from == [1900]
+        assert len(submissions) == 300
+
+    def test_fetch_submissions_trusted(self):
+        api = FakeSubmissionsAPI([make_row(i, 1000 + i) for i in range(10)])
+        with mock.patch("src.client.UpstreamClient.get", side_effect=api.get):
+            validated = ap.fetch_submissions_sync("iwbc_mzk")
+            trusted = ap.fetch_submissions_sync("iwbc_mzk", trusted=True)
+
+        assert all(isinstance(s, Submission) for s in validated)
+        assert [s.to_dict() for s in trusted] == [s.model_dump() for s in validated]
+
+    def test_fetch_submissions_invalid_row(self):
+        row = make_row(1, 1000)
+        del row["problem_id"]
+        api = FakeSubmissionsAPI([make_row(0, 999), row])
+        with mock.patch("src.client.UpstreamClient.get", side_effect=api.get):
+            with pytest.raises(ValidationError) as e:
+                ap.fetch_submissions_sync("iwbc_mzk")
+
+        assert e.value.errors()[0]["loc"] == (1, "problem_id")
+        assert SubmissionStore.load("iwbc_mzk") is None
+
+
+class TestSubmissionStore:
+    @pytest.fixture(autouse=True)
+    def store_dir(self, tmp_path, monkeypatch):
+        self.directory = tmp_path / "submissions"
+        monkeypatch.setattr(SubmissionStore, "directory", str(self.directory))
+
+    def save(self) -> StoredSubmissions:
+        stored = StoredSubmissions(user_id="iwbc_mzk", from_second=1000)
+        stored.merge([make_row(i, 1000 + i, "WJ" if i == 5 else "AC") for i in range(10)])
+        SubmissionStore.save(stored)
+        return stored
+
+    def test_save_load(self):
+        stored = self.save()
+        loaded = SubmissionStore.load("iwbc_mzk")
+
+        assert loaded is not None
+        assert loaded.from_second == 1000
+        assert loaded.last_epoch_second == 1009
+        assert loaded.last_id == 9
+        assert loaded.table.to_dicts() == stored.table.to_dicts()
+        assert loaded.resume_second() == 1005
+        # 他のユーザーからは読み書きできない
+        assert self.directory.stat().st_mode & 0o777 == 0o700
+
+    def test_other_user(self):
+        self.save()
+        (self.directory / "iwbc_mzk.bin").rename(self.directory / "other.bin")
+        assert SubmissionStore.load("other") is None
+
+    @pytest.mark.parametrize(
+        "corrupt",
+        [
+            lambda content: b"",
+            lambda content: content[:-3],
+            lambda content: content[:20],
+            lambda content: b"\x80\x04garbage" + content,
+            lambda content: content.replace(b'"version":3', b'"version":2'),
+            lambda content: content.replace(b'"count":10', b'"count":11'),
+            lambda content: content.replace(b'"results":["AC","WJ"]', b'"results":["AC"]'),
+            lambda content: content.replace(b'"strings":{', b'"strings":{"x":1,'),
+        ],
+    )
+    def test_corrupt(self, corrupt):
+        self.save()
+        path = self.directory / "iwbc_mzk.bin"
+        content = path.read_bytes()
+        corrupted = corrupt(content)
+        assert corrupted != content
+        path.write_bytes(corrupted)
+        # 読めないファイルは取得し直す
+        assert SubmissionStore.load("iwbc_mzk") is None
+
+
+PROBLEM_MODELS = {
+    "abc315_a": {"difficulty": -1056, "discrimination": 0.004, "is_experimental": False},
+    "abc315_f": {"slope": -0.0004, "difficulty": 2041, "irt_users": 6000},
+    "practice_1": {"is_experimental": False},
+}
+
+
+class FakeProblemModelsAPI:
+    def __init__(self) -> None:
+        self.etag = '"v1"'
+        self.requests: list[Request] = []
+
+    def handler(self, request: Request) -> Response:
+        self.requests.append(request)
+        if request.headers.get("If-None-Match") == self.etag:
+            return Response(304)
+        return Response(200, json=PROBLEM_MODELS, headers={"ETag": self.etag})
+
+
+class TestProblemModelStore:
+    @pytest.fixture(autouse=True)
+    def store_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(ProblemModelStore, "directory", str(tmp_path))
+        ProblemModelStore.clear()
+        yield
+        ProblemModelStore.clear()
+
+    def test_fetch_problem_models(self):
+        api = FakeProblemModelsAPI()
+        with mock_upstream(api.handler):
+            problems = ap.fetch_problem_models_sync()
+
+        assert set(problems) == set(PROBLEM_MODELS)
+        assert all(isinstance(p, ProblemModel) for p in problems.values())
+        assert problems["abc315_f"].difficulty == 2041
+        assert problems["abc315_f"].irt_users == 6000
+
+    def test_fetch_difficulties(self):
+        api = FakeProblemModelsAPI()
+        with mock_upstream(api.handler):
+            difficulties = ap.fetch_problem_difficulties_sync()
+
+        assert len(difficulties) == 3
+        assert difficulties.get("abc315_a") == -1056
+        assert difficulties.get("abc315_f") == 2041
+        # difficulty がない問題と存在しない問題
+        assert difficulties.get("practice_1") is None
+        assert "practice_1" in difficulties
+        assert difficulties.get("abc000_a") is None
+
+    def test_revalidate(self, monkeypatch):
+        api = FakeProblemModelsAPI()
+        with mock_upstream(api.handler):
+            ap.fetch_problem_difficulties_sync()
+            # 間隔内なら問い合わせない
+            ap.fetch_problem_difficulties_sync()
+            assert len(api.requests) == 1
+
+            monkeypatch.setattr(ProblemModelStore, "revalidate_interval", 0)
+            difficulties = ap.fetch_problem_difficulties_sync()
+
+        assert len(api.requests) == 2
+        assert api.requests[1].headers["If-None-Match"] == '"v1"'
+        assert difficulties.get("abc315_f") == 2041
+
+    def test_load_from_disk(self):
+        api = FakeProblemModelsAPI()
+        with mock_upstream(api.handler):
+            ap.fetch_problem_difficulties_sync()
+
+            # 別プロセスの起動を想定して、メモリ上のデータを捨てる
+            ProblemModelStore.clear()
+            difficulties = ap.fetch_problem_difficulties_sync()
+
+        assert len(api.requests) == 1
+        assert isinstance(difficulties._difficulties, memoryview)
+        assert difficulties.many(["abc315_a", "abc315_f"]) == [-1056, 2041]
+
+    def test_revalidate_error(self, monkeypatch):
+        api = FakeProblemModelsAPI()
+        with mock_upstream(api.handler):
+            ap.fetch_problem_difficulties_sync()
+
+        monkeypatch.setattr(ProblemModelStore, "revalidate_interval", 0)
+        with mock_upstream(lambda request: Response(503)):
+            difficulties = ap.fetch_problem_difficulties_sync()
+        assert difficulties.get("abc315_f") == 2041
+
+        # 手元にデータがなければエラーにする
+        ProblemModelStore.clear()
+        ProblemModelStore._write("meta.json", lambda f: f.write(b"{}"))
+        with mock_upstream(lambda request: Response(503)):
+            with pytest.raises(HTTPStatusError):
+                ap.fetch_problem_difficulties_sync()
+
+    def test_not_modified_without_meta(self, monkeypatch):
+        api = FakeProblemModelsAPI()
+        with mock_upstream(api.handler):
+            ap.fetch_problem_difficulties_sync()
+
+        # meta を読めなかった状態で 304 が返ってきた場合
+        monkeypatch.setattr(ProblemModelStore, "_meta", None)
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            if len(requests) == 1:
+                return Response(304)
+            return Response(200, json=PROBLEM_MODELS, headers={"ETag": '"v2"'})
+
+        with mock_upstream(handler):
+            difficulties = ap.fetch_problem_difficulties_sync()
+
+        assert len(requests) == 2
+        assert "If-None-Match" not in requests[1].headers
+        assert difficulties.get("abc315_f") == 2041
+        assert ProblemModelStore._meta is not None
+        assert ProblemModelStore._meta.etag == '"v2"'
+
+    def test_from_models(self):
+        difficulties = ProblemDifficulties.from_models(PROBLEM_MODELS)
+        assert difficulties.problem_ids == sorted(PROBLEM_MODELS)
+        assert len(difficulties.difficulties_bytes()) == 3 * 4
@@ -0,0 +1,194 @@
+from unittest import mock
+import asyncio
+
+import pytest
+
+from src.cache import LRUCache, SingleFlight, SWRCache, cache_key
+from src.cards.stats import StatsOption
+from src.themes import THEMES
+
+
+class TestLRUCache:
+    def test_get_set(self):
+        cache = LRUCache(max_bytes=100, ttl=60)
+        assert cache.get("a") is None
+
+        cache.set("a", b"svg")
+        assert cache.get("a") == b"svg"
+        assert cache.stats() == {
+            "hits": 1,
+            "misses": 1,
+            "evictions": 0,
+            "entries": 1,
+            "bytes": 3,
+        }
+
+    def test_ttl(self):
+        cache = LRUCache(max_bytes=100, ttl=60)
+        with mock.patch("time.monotonic", return_value=1000):
+            cache.set("a", b"svg")
+            cache.set("b", b"svg", ttl=120)
+        with mock.patch("time.monotonic", return_value=1060):
+            assert cache.get("a") is None
+            assert cache.get("b") == b"svg"
+        assert len(cache) == 1
+        assert cache.size == 3
+
+    def test_lru_eviction(self):
+        cache = LRUCache(max_bytes=10, ttl=60)
+        cache.set("a", b"1234")
+        cache.set("b", b"1234")
+        cache.get("a")
+        cache.set("c", b"1234")
+
+        # 最も長く使われていない b が捨てられる
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1234"
+        assert cache.get("c") == b"1234"
+        assert cache.evictions == 1
+        assert cache.size == 8
+
+        # 上限より大きい値は保持しない
+        cache.set("d", b"x" * 11)
+        assert cache.get("d") is None
+        assert cache.size == 8
+
+
+class TestCacheKey:
+    def test_normalized(self):
+        a, b = StatsOption(), StatsOption()
+        a.hide = {"rank", "rating", "last_competed"}
+        b.hide = {"last_competed", "rating", "rank"}
+        assert cache_key("stats", "iwbc_mzk", a) == cache_key("stats", "iwbc_mzk", b)
+
+        b.theme = THEMES["darcula"]
+        assert cache_key("stats", "iwbc_mzk", a) != cache_key("stats", "iwbc_mzk", b)
+        assert cache_key("stats", "iwbc_mzk", a) != cache_key("stats", "other", a)
+
+
+class TestSingleFlight:
+    def test_share_result(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return f"result-{key}"
+
+        async def run():
+            return await asyncio.gather(
+                *[flight.do(key, lambda key=key: fetch(key)) for key in "aaab"]
+            )
+
+        results = asyncio.run(run())
+        assert results == ["result-a", "result-a", "result-a", "result-b"]
+        assert calls == ["a", "b"]
+        assert len(flight) == 0
+
+    def test_share_exception(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("User Name Not Found.", "")
+
+        async def run():
+            return await asyncio.gather(
+                flight.do("a", fetch), flight.do("a", fetch), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, ValueError) for r in results)
+        assert len(calls) == 1
+
+        # 終わった後は新しく取得する
+        with pytest.raises(ValueError):
+            asyncio.run(flight.do("a", fetch))
+        assert len(calls) == 2
+
+    def test_waiter_cancelled(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        async def run():
+            first = asyncio.ensure_future(flight.do("a", fetch))
+            second = asyncio.ensure_future(flight.do("a", fetch))
+            await asyncio.sleep(0.005)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(run()) == "ok"
+
+
+class TestSWRCache:
+    def setup_method(self):
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        return self.calls
+
+    def test_fresh_stale_expired(self):
+        cache = SWRCache(soft_ttl=60, hard_ttl=600, max_entries=10)
+
+        async def get_at(now):
+            with mock.patch("src.cache.time") as time_mock:
+                time_mock.monotonic.return_value = now
+                value = await cache.get("a", self.fetch)
+                # バックグラウンド更新を終わらせる
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+                return value
+
+        async def run():
+            results = [await get_at(0)]  # miss
+            results.append(await get_at(30))  # fresh
+            results.append(await get_at(100))  # stale: 古い値を返して裏で更新
+            results.append(await get_at(110))  # 更新済み
+            results.append(await get_at(1000))  # hard_ttl 切れ: 取得を待つ
+            return results
+
+        assert asyncio.run(run()) == [1, 1, 1, 2, 3]
+        assert self.calls == 3
+        assert cache.stats() == {
+            "hits": 2,
+            "stale_hits": 1,
+            "misses": 2,
+            "refresh_errors": 0,
+            "entries": 1,
+        }
+
+    def test_refresh_error_keeps_stale(self):
+        cache = SWRCache(soft_ttl=60, hard_ttl=600, max_entries=10)
+
+        async def fail():
+            raise ValueError("User Name Not Found.", "")
+
+        async def run():
+            with mock.patch("src.cache.time") as time_mock:
+                time_mock.monotonic.return_value = 0
+                await cache.get("a", self.fetch)
+                time_mock.monotonic.return_value = 100
+                value = await cache.get("a", fail)
+                await asyncio.sleep(0.01)
+                return value, await cache.get("a", fail)
+
+        assert asyncio.run(run()) == (1, 1)
+        assert cache.refresh_errors >= 1
+
+    def test_max_entries(self):
+        cache = SWRCache(soft_ttl=60, hard_ttl=600, max_entries=2)
+
+        async def run():
+            for key in "abc":
+                await cache.get(key, self.fetch)
+            return await cache.get("a", self.fetch)
+
+        assert asyncio.run(run()) == 4
+        assert len(cache) == 2
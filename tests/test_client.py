@@ -0,0 +1,61 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.client import UpstreamClient, UpstreamError, run_sync
+
+
+class TestUpstreamClient:
+    def setup_method(self):
+        self.requested = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requested.append(str(request.url))
+            if request.url.path == "/timeout":
+                raise httpx.ReadTimeout("timeout", request=request)
+            if request.url.path == "/down":
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200, text="ok")
+
+        UpstreamClient.transport = httpx.MockTransport(handler)
+
+    def teardown_method(self):
+        UpstreamClient.transport = None
+
+    def test_get_ok(self):
+        res = run_sync(UpstreamClient.get("https://atcoder.jp/users/iwbc_mzk"))
+        assert res.status_code == 200
+        assert res.text == "ok"
+        assert self.requested == ["https://atcoder.jp/users/iwbc_mzk"]
+
+    def test_client_is_pooled_per_host(self):
+        async def clients():
+            a1 = UpstreamClient.get_client("https://atcoder.jp/users/a")
+            a2 = UpstreamClient.get_client("https://atcoder.jp/users/b")
+            k = UpstreamClient.get_client("https://kenkoooo.com/atcoder/")
+            await UpstreamClient.aclose()
+            return a1, a2, k
+
+        a1, a2, k = run_sync(clients())
+        assert a1 is a2
+        assert a1 is not k
+        assert a1.is_closed and k.is_closed
+
+    @pytest.mark.parametrize(
+        "path, message",
+        [("/timeout", "Upstream Timeout."), ("/down", "Upstream Connection Error.")],
+    )
+    def test_get_ng(self, path, message):
+        with pytest.raises(UpstreamError) as e:
+            run_sync(UpstreamClient.get(f"https://atcoder.jp{path}"))
+        assert e.value.args[0] == message
+
+    def test_concurrent_requests(self):
+        async def fetch_all():
+            return await asyncio.gather(
+                *[UpstreamClient.get(f"https://atcoder.jp/users/{i}") for i in range(5)]
+            )
+
+        responses = run_sync(fetch_all())
+        assert [r.status_code for r in responses] == [200] * 5
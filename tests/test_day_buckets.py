@@ -0,0 +1,112 @@
+import datetime
+
+import pytest
+
+from src.day_buckets import DayBuckets, parse_tz_offset, date_to_day_index
+from src.atcoder_problems import Submission
+
+JST = 9 * 60 * 60
+
+
+def make_submission(epoch_second: int, problem_id: str = "abc315_a", result: str = "AC"):
+    return Submission(
+        id=1,
+        epoch_second=epoch_second,
+        problem_id=problem_id,
+        contest_id="abc315",
+        user_id="iwbc_mzk",
+        language="Python (PyPy 3.10-v7.3.12)",
+        point=100,
+        length=262,
+        result=result,
+        execution_time=55,
+    )
+
+
+def epoch(*args, offset: int = JST) -> int:
+    tz = datetime.timezone(datetime.timedelta(seconds=offset))
+    return int(datetime.datetime(*args, tzinfo=tz).timestamp())
+
+
+class TestParseTzOffset:
+    @pytest.mark.parametrize(
+        "tz, offset",
+        [
+            ("UTC", 0),
+            ("jst", JST),
+            ("+09:00", JST),
+            ("+0900", JST),
+            ("+9", JST),
+            ("UTC+9", JST),
+            ("-05:30", -(5 * 60 + 30) * 60),
+            # クエリ文字列で "+" が空白になったもの
+            (" 09:00", JST),
+            ("UTC 9", JST),
+        ],
+    )
+    def test_ok(self, tz, offset):
+        assert parse_tz_offset(tz) == offset
+
+    @pytest.mark.parametrize("tz", [None, ""])
+    def test_default(self, tz):
+        # サーバーのタイムゾーン (夏時間を含む) によらず日本時間
+        assert parse_tz_offset(tz) == JST
+
+    @pytest.mark.parametrize("tz", ["Asia/Tokyo", "+25:00", "+09:75", "abc"])
+    def test_ng(self, tz):
+        with pytest.raises(ValueError) as e:
+            parse_tz_offset(tz)
+        assert e.value.args[0] == "Invalid Timezone."
+
+
+class TestDayBuckets:
+    def setup_method(self):
+        self.from_ = datetime.date(2023, 8, 20)
+        self.to_ = datetime.date(2023, 8, 27)
+        self.submissions = [
+            make_submission(epoch(2023, 8, 20, 0, 0)),
+            make_submission(epoch(2023, 8, 20, 23, 59)),
+            make_submission(epoch(2023, 8, 20, 23, 59), result="WA"),
+            make_submission(epoch(2023, 8, 21, 0, 0), "abc315_b"),
+            make_submission(epoch(2023, 8, 21, 1, 0), "abc315_b"),
+            make_submission(epoch(2023, 8, 21, 2, 0), "abc315_c"),
+            # 期間外
+            make_submission(epoch(2023, 8, 19, 23, 59)),
+            make_submission(epoch(2023, 8, 27, 0, 0)),
+        ]
+
+    @pytest.mark.parametrize(
+        "type_, counts",
+        [
+            ("all", [3, 3, 0, 0, 0, 0, 0]),
+            ("ac", [2, 3, 0, 0, 0, 0, 0]),
+            ("unique_ac", [1, 2, 0, 0, 0, 0, 0]),
+        ],
+    )
+    def test_type(self, type_, counts):
+        buckets = DayBuckets.from_dates(self.from_, self.to_, JST)
+        buckets.add_submissions(self.submissions, type_)
+        assert buckets.counts == counts
+
+    def test_timezone(self):
+        # UTC では JST 9:00 より前の提出は前日になる
+        buckets = DayBuckets.from_dates(self.from_, self.to_, 0)
+        buckets.add_submissions(self.submissions)
+        assert buckets.counts == [5, 0, 0, 0, 0, 0, 1]
+
+    def test_start_second(self):
+        buckets = DayBuckets.from_dates(self.from_, self.to_, JST)
+        assert buckets.start_second == epoch(2023, 8, 20, 0, 0)
+        assert buckets.start_day == date_to_day_index(self.from_)
+
+    def test_items_and_merge(self):
+        a = DayBuckets.from_dates(self.from_, self.to_, JST)
+        a.add_submissions(self.submissions)
+        b = DayBuckets.from_dates(self.from_, self.to_, JST)
+        b.add_submissions(self.submissions[:1])
+        a.merge(b)
+
+        items = a.items()
+        assert items[0] == (datetime.date(2023, 8, 20), 4)
+        assert items[-1] == (datetime.date(2023, 8, 26), 0)
+        assert len(items) == 7
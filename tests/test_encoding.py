@@ -0,0 +1,60 @@
+import gzip
+
+import brotli
+import pytest
+
+from src.encoding import EncodedBody, parse_accept_encoding, etag_header, etag_matches
+
+BODY = b"<svg>" + b"<div class='heatmap-cell'></div>" * 200 + b"</svg>"
+
+
+class TestEncoding:
+    def test_compress(self):
+        body = EncodedBody.compress(BODY)
+        assert gzip.decompress(body.gzip) == BODY
+        assert brotli.decompress(body.br) == BODY
+        assert len(body) == len(BODY) + len(body.gzip) + len(body.br)
+
+    @pytest.mark.parametrize(
+        "accept_encoding, expected",
+        [
+            (None, "identity"),
+            ("", "identity"),
+            ("gzip", "gzip"),
+            ("gzip, deflate, br", "br"),
+            ("gzip, br;q=0.5", "gzip"),
+            ("br;q=0, gzip;q=0", "identity"),
+            ("*", "br"),
+            ("deflate", "identity"),
+            ("GZIP", "gzip"),
+        ],
+    )
+    def test_negotiate(self, accept_encoding, expected):
+        body = EncodedBody.compress(BODY)
+        encoding, content = body.negotiate(accept_encoding)
+        assert encoding == expected
+        assert content == getattr(body, expected)
+
+    def test_negotiate_without_brotli(self):
+        body = EncodedBody(identity=BODY, gzip=gzip.compress(BODY))
+        assert body.negotiate("br")[0] == "identity"
+        assert body.negotiate("br, gzip")[0] == "gzip"
+
+    def test_parse_accept_encoding(self):
+        assert parse_accept_encoding("gzip;q=0.8, identity;q=0") == {
+            "gzip": 0.8,
+            "identity": 0.0,
+        }
+        assert parse_accept_encoding("br;q=abc")["br"] == 0.0
+
+    def test_etag(self):
+        assert etag_header("abc", "identity") == '"abc"'
+        assert etag_header("abc", "br") == '"abc-br"'
+
+        assert etag_matches('"abc"', "abc")
+        assert etag_matches('"abc-gzip"', "abc")
+        assert etag_matches('W/"abc-br"', "abc")
+        assert etag_matches('"xyz", "abc"', "abc")
+        assert etag_matches("*", "abc")
+        assert not etag_matches(None, "abc")
+        assert not etag_matches('"abcd"', "abc")
@@ -90,3 +90,16 @@ class TestErrorCard:
 
         title = svg.find(id="title").string
         assert title == TITLE
+
+    def test_minify(self):
+        error_card = ErrorCard(message="Main Message", secondary_message="Secondary Message")
+        soup = BeautifulSoup(error_card.render(minify=True), "html.parser")
+
+        assert soup.find(id="main-message").string == "Main Message"
+        assert soup.find(id="secondary-message").string == "Secondary Message"
+
+        style = soup.find("style", id="main-style").string
+        title_color = get_property_from_css(serialize_css(style), "#title", "color")
+        assert title_color == THEMES["default"].title_color
+        # calc() の中の空白は残す
+        assert "#body-container{height:calc(100% - 35px)}" in style
@@ -0,0 +1,41 @@
+import base64
+import re
+
+import pytest
+
+from src.cards.error import ErrorCard
+from src.cards.grid import GridCard
+from src.metrics import RENDER_SECONDS
+from src.timing import collect
+
+
+class TestGridCard:
+    def test_layout(self):
+        panels = [
+            ErrorCard("a").render(minify=True).encode(),
+            ErrorCard("b").render(minify=True).encode(),
+            ErrorCard("c").render(minify=True).encode(),
+        ]
+        svg = GridCard(panels, columns=2, gap=10).render()
+
+        assert svg.startswith('<svg version="1.1" viewBox="0 0 1210 310"')
+        images = re.findall(r'<image x="(\d+)" y="(\d+)" width="600" height="150" href="data:image/svg\+xml;base64,([^"]+)"/>', svg)
+        assert [(x, y) for x, y, _ in images] == [("0", "0"), ("610", "0"), ("0", "160")]
+        # カードはそのまま (別の文書として) 埋め込まれる
+        assert [base64.b64decode(data) for _, _, data in images] == panels
+
+    def test_columns_more_than_panels(self):
+        svg = GridCard([ErrorCard().render().encode()], columns=5).render()
+        assert 'viewBox="0 0 600 150"' in svg
+
+    def test_invalid_panel(self):
+        with pytest.raises(ValueError):
+            GridCard([b"<svg></svg>"])
+
+    def test_render_timing(self):
+        # 他のカードと同じく、描画時間が計測される
+        before = RENDER_SECONDS.count(card="GridCard")
+        with collect() as timings:
+            GridCard([ErrorCard().render().encode()]).render()
+        assert RENDER_SECONDS.count(card="GridCard") == before + 1
+        assert [name for name, _ in timings.phases] == ["render", "render"]
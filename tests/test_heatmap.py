@@ -1,5 +1,6 @@
 import datetime
 from typing import Optional
+from xml.etree import ElementTree
 
 from bs4 import BeautifulSoup
 import pytest
@@ -9,7 +10,8 @@ from src.atcoder_problems import Submission
 from src.themes import THEMES
 from tests.utils import get_property_from_css, serialize_css
 
-NOW = datetime.datetime.now()
+# タイムゾーンの指定がなければ日本時間で日付を区切る
+NOW = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=9)))
 
 USER_NAME = "iwbc_mzk"
 SUBMISSIONS = [
@@ -372,3 +374,68 @@ class TestHeatmapCard:
             assert len(fadein_elements) == 0
         else:
             assert len(fadein_elements) >= 0
+
+    def test_date_window(self):
+        today = datetime.datetime(2023, 8, 30)  # Wednesday
+        from_, to_ = HeatmapCard.date_window(today)
+
+        assert to_ == datetime.datetime(2023, 9, 3)
+        assert from_ == to_ - datetime.timedelta(weeks=HeatmapCard.weeks_num)
+        assert from_.isoweekday() == 7
+
+    def test_tz_option(self):
+        option = HeatmapOption()
+        option.tz = "+14:00"
+        heatmap_card = HeatmapCard(
+            username=USER_NAME, submissions=SUBMISSIONS, option=option
+        )
+        soup = BeautifulSoup(heatmap_card.render(), "html.parser")
+
+        utc = datetime.datetime.now(datetime.timezone.utc)
+        today = (utc + datetime.timedelta(hours=14)).strftime("%Y-%m-%d")
+        heatmap_cells = soup.find(id="heatmap-cells").find_all(class_="heatmap-cell")
+        heatmap_cells.sort(key=lambda x: x.attrs.get("id"))
+        assert heatmap_cells[-1].attrs.get("id") == today
+
+        total = sum(int(c.attrs.get("_test_submission_count", 0)) for c in heatmap_cells)
+        assert total == len(SUBMISSIONS)
+
+    def test_minify(self):
+        heatmap_card = HeatmapCard(username=USER_NAME, submissions=SUBMISSIONS)
+        pretty = heatmap_card.render()
+        minified = heatmap_card.render(minify=True)
+        assert len(minified) < len(pretty)
+
+        # SVG として読めること
+        ElementTree.fromstring(minified)
+        assert "\n" not in minified
+        assert "_test_submission_count" not in minified
+
+        soup = BeautifulSoup(minified, "html.parser")
+        pretty_soup = BeautifulSoup(pretty, "html.parser")
+        cells = soup.find(id="heatmap-cells").find_all(class_="heatmap-cell")
+        pretty_cells = pretty_soup.find(id="heatmap-cells").find_all(class_="heatmap-cell")
+        assert [c.attrs["id"] for c in cells] == [c.attrs["id"] for c in pretty_cells]
+
+        # 色はインラインスタイルではなくクラスで指定する
+        styles = serialize_css(soup.find("style", id="main-style").string)
+        for cell, pretty_cell in zip(cells, pretty_cells):
+            level = [c for c in cell.attrs["class"] if c.startswith("level-")][0]
+            color = get_property_from_css(styles, f".{level}", "background-color")
+            assert f"background-color: {color}" in pretty_cell.attrs["style"]
+
+    def test_day_buckets(self):
+        # 集計済みの日ごとの提出数からも作れる (提出から作った場合と同じ出力)
+        buckets = HeatmapCard.window_buckets()
+        buckets.add_submissions(SUBMISSIONS, "ac")
+        buckets.add_submissions(SUBMISSIONS, "ac")
+
+        option = HeatmapOption(type="ac")
+        from_buckets = HeatmapCard(USER_NAME, buckets, option).render()
+        from_submissions = HeatmapCard(USER_NAME, SUBMISSIONS * 2, option).render()
+        assert from_buckets == from_submissions
+
+        soup = BeautifulSoup(from_buckets, "html.parser")
+        heatmap_cells = soup.find(id="heatmap-cells").find_all(class_="heatmap-cell")
+        heatmap_cells.sort(key=lambda x: x.attrs.get("id"))
+        assert heatmap_cells[-1].attrs.get("_test_submission_count") == "8"
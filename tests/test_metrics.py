@@ -0,0 +1,49 @@
+from src.metrics import Registry
+
+
+class TestMetrics:
+    def test_counter(self):
+        registry = Registry()
+        counter = registry.counter("responses_total", "Responses.", ["host", "status"])
+        counter.inc(host="atcoder.jp", status="200")
+        counter.inc(2, host="atcoder.jp", status="200")
+        counter.inc(host="kenkoooo.com", status="error")
+
+        assert counter.value(host="atcoder.jp", status="200") == 3
+        assert registry.render() == "\n".join(
+            [
+                "# HELP atcoder_readme_stats_responses_total Responses.",
+                "# TYPE atcoder_readme_stats_responses_total counter",
+                'atcoder_readme_stats_responses_total{host="atcoder.jp",status="200"} 3',
+                'atcoder_readme_stats_responses_total{host="kenkoooo.com",status="error"} 1',
+                "",
+            ]
+        )
+
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.histogram("pages", "Pages.", buckets=(1, 5))
+        for value in [1, 2, 10]:
+            histogram.observe(value)
+
+        assert histogram.count() == 3
+        assert registry.render().splitlines()[2:] == [
+            'atcoder_readme_stats_pages_bucket{le="1"} 1',
+            'atcoder_readme_stats_pages_bucket{le="5"} 2',
+            'atcoder_readme_stats_pages_bucket{le="+Inf"} 3',
+            "atcoder_readme_stats_pages_sum 13",
+            "atcoder_readme_stats_pages_count 3",
+        ]
+
+    def test_gauge(self):
+        registry = Registry()
+        registry.gauge("entries", "Entries.", ["cache"], lambda: [(("svg",), 2)])
+        assert registry.render().splitlines()[1:] == [
+            "# TYPE atcoder_readme_stats_entries gauge",
+            'atcoder_readme_stats_entries{cache="svg"} 2',
+        ]
+
+    def test_escape(self):
+        registry = Registry()
+        registry.counter("c", "C.", ["route"]).inc(route='a"\\')
+        assert registry.render().splitlines()[2] == 'atcoder_readme_stats_c{route="a\\"\\\\"} 1'
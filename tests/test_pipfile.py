@@ -0,0 +1,33 @@
+import json
+import tomllib
+
+
+def normalize(name: str) -> str:
+    return name.lower().replace("_", "-")
+
+
+def load():
+    with open("Pipfile", "rb") as f:
+        pipfile = tomllib.load(f)
+    with open("Pipfile.lock", "r", encoding="utf-8") as f:
+        lock = json.load(f)
+    return pipfile, lock
+
+
+class TestPipfileLock:
+    # デプロイ時は Pipfile.lock からインストールされるので、Pipfile との食い違いを検出する
+    def test_packages_locked(self):
+        pipfile, lock = load()
+        locked = {normalize(name) for name in lock["default"]}
+        missing = {normalize(name) for name in pipfile["packages"]} - locked
+        assert not missing, "run `pipenv lock`"
+        # brotli がないと src.encoding は br を返さなくなるだけなので、ここで気づけるようにする
+        assert "brotli" in locked
+
+    def test_dev_packages_locked(self):
+        pipfile, lock = load()
+        runtime = {normalize(name) for name in pipfile["packages"]}
+        dev_only = {normalize(name) for name in pipfile["dev-packages"]} - runtime
+        assert not dev_only - {normalize(name) for name in lock["develop"]}
+        # 開発用に移したもの (beautifulsoup4 など) が本番の依存に残っていないこと
+        assert not dev_only & {normalize(name) for name in lock["default"]}
@@ -0,0 +1,279 @@
+import time
+from unittest import mock
+
+import pytest
+from fastapi.testclient import TestClient
+from httpx import Response
+
+from api.router import app, svg_cache, data_cache
+from src.submission_store import SubmissionStore
+from src.timing import add_hook, remove_hook
+from src.metrics import (
+    REGISTRY,
+    REQUEST_SECONDS,
+    UPSTREAM_RESPONSES,
+    SUBMISSION_PAGES,
+    RENDER_SECONDS,
+    ERROR_CARDS,
+)
+from tests.utils import mock_upstream
+
+
+class TestRouter:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(SubmissionStore, "directory", str(tmp_path))
+        svg_cache.clear()
+        data_cache.clear()
+
+        with open("tests/html/profile.html", "r", encoding="utf-8") as pr, open(
+            "tests/json/competition_history.json", "r", encoding="utf-8"
+        ) as ch:
+            self.profile = pr.read()
+            self.compe = ch.read()
+        self.requested = []
+
+    def handler(self, request):
+        self.requested.append(request.url.path)
+        if request.url.host == "kenkoooo.com":
+            return Response(200, text="[]")
+        if request.url.path.endswith("/history/json"):
+            return Response(200, text=self.compe)
+        return Response(200, text=self.profile)
+
+    def test_stats_cache(self):
+        with TestClient(app) as client, mock_upstream(self.handler):
+            res = client.get("/stats/iwbc_mzk?hide=rank,last_competed")
+            assert res.status_code == 200
+            assert res.headers["content-type"] == "image/svg+xml"
+            assert res.headers["x-cache"] == "MISS"
+
+            # オプションの順序が違っても同じキャッシュを使う
+            cached = client.get("/stats/iwbc_mzk?hide=last_competed,rank")
+            assert cached.headers["x-cache"] == "HIT"
+            assert cached.content == res.content
+
+            other = client.get("/stats/iwbc_mzk?theme=darcula")
+            assert other.headers["x-cache"] == "MISS"
+
+            stats = client.get("/cache/stats").json()["svg"]
+
+        assert len(self.requested) == 2
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+
+    def test_heatmap_cache(self):
+        with TestClient(app) as client, mock_upstream(self.handler):
+            assert client.get("/heatmap/iwbc_mzk").headers["x-cache"] == "MISS"
+            assert client.get("/heatmap/iwbc_mzk").headers["x-cache"] == "HIT"
+
+        assert len(self.requested) == 1
+
+    @pytest.mark.parametrize("tz", ["+09:00", "%2B09:00", "UTC+9", "-05:00"])
+    def test_heatmap_tz(self, tz):
+        # エンコードされていない "+" は空白として届く
+        with TestClient(app) as client, mock_upstream(self.handler):
+            res = client.get(f"/heatmap/iwbc_mzk?tz={tz}")
+
+        assert res.status_code == 200
+        assert res.headers["x-cache"] == "MISS"
+        assert "Invalid Timezone." not in res.text
+
+    def test_error_not_cached(self):
+        with TestClient(app) as client, mock_upstream(lambda request: Response(404)):
+            res = client.get("/stats/iwbc_mzk")
+            assert res.headers["cache-control"] == "no-cache, no-store, must-revalidate"
+            client.get("/stats/iwbc_mzk")
+
+        assert svg_cache.stats()["entries"] == 0
+
+    @pytest.mark.parametrize(
+        "accept_encoding, content_encoding",
+        [("br", "br"), ("gzip", "gzip"), ("identity", None)],
+    )
+    def test_content_encoding(self, accept_encoding, content_encoding):
+        with TestClient(app) as client, mock_upstream(self.handler):
+            for x_cache in ["MISS", "HIT"]:
+                res = client.get(
+                    "/heatmap/iwbc_mzk", headers={"Accept-Encoding": accept_encoding}
+                )
+                assert res.headers["x-cache"] == x_cache
+                assert res.headers["vary"] == "Accept-Encoding"
+                assert res.headers.get("content-encoding") == content_encoding
+                # httpx が展開した中身は圧縮前と同じ
+                assert res.text.startswith("<svg")
+
+    @pytest.mark.parametrize("path", ["/stats/iwbc_mzk", "/heatmap/iwbc_mzk"])
+    def test_conditional_get(self, path):
+        with TestClient(app) as client, mock_upstream(self.handler):
+            res = client.get(path, headers={"Accept-Encoding": "gzip"})
+            etag = res.headers["etag"]
+            assert etag.endswith('-gzip"')
+
+            cached = client.get(
+                path, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+            )
+            assert cached.status_code == 304
+            assert cached.headers["x-cache"] == "HIT"
+            assert cached.headers["etag"] == etag
+            assert cached.content == b""
+
+            # SVG がキャッシュから消えても、データが同じなら描画せずに 304 を返す
+            svg_cache.clear()
+            with mock.patch("src.cards.card.Card.render") as render:
+                res = client.get(path, headers={"If-None-Match": etag})
+            assert res.status_code == 304
+            assert res.headers["x-cache"] == "MISS"
+            render.assert_not_called()
+
+            # オプションが違えば別の ETag
+            other = client.get(f"{path}?theme=darcula", headers={"If-None-Match": etag})
+            assert other.status_code == 200
+            assert other.headers["etag"] != etag
+
+        # 上流への問い合わせは最初の1回だけ
+        assert len(self.requested) == 1
+
+    def test_server_timing(self):
+        calls = []
+
+        def hook(path, timings):
+            calls.append((path, timings.totals()))
+
+        add_hook(hook)
+        try:
+            with TestClient(app) as client, mock_upstream(self.handler):
+                res = client.get("/stats/iwbc_mzk?show_history=true")
+                cached = client.get("/stats/iwbc_mzk?show_history=true")
+        finally:
+            remove_hook(hook)
+
+        names = [m.split(";")[0] for m in res.headers["server-timing"].split(", ")]
+        assert {"profile", "history", "history_decode", "render", "total"} <= set(names)
+        assert cached.headers["server-timing"].startswith("total;dur=")
+
+        assert [path for path, _ in calls] == ["/stats/{username}"] * 2
+        assert "render" in calls[0][1]
+        assert "render" not in calls[1][1]
+
+    def test_metrics(self):
+        REGISTRY.clear()
+        with TestClient(app) as client, mock_upstream(self.handler):
+            client.get("/stats/iwbc_mzk")
+            client.get("/heatmap/iwbc_mzk")
+            client.get("/heatmap/iwbc_mzk?tz=invalid")
+            res = client.get("/metrics")
+
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert REQUEST_SECONDS.count(route="/stats/{username}", status="200") == 1
+        assert REQUEST_SECONDS.count(route="/heatmap/{username}", status="200") == 2
+        assert UPSTREAM_RESPONSES.value(host="atcoder.jp", status="200") == 1
+        assert UPSTREAM_RESPONSES.value(host="kenkoooo.com", status="200") == 1
+        assert SUBMISSION_PAGES.count() == 1
+        assert RENDER_SECONDS.count(card="StatsCard") == 1
+        assert RENDER_SECONDS.count(card="ErrorCard") == 1
+        assert ERROR_CARDS.value(endpoint="heatmap", cause="invalid_option") == 1
+
+        text = res.text
+        assert 'atcoder_readme_stats_upstream_request_duration_seconds_count{host="atcoder.jp"} 1' in text
+        # キャッシュの統計は他のテストの分も含むので、出力されていることだけ確認する
+        assert 'atcoder_readme_stats_cache_events_total{cache="svg",event="misses"} ' in text
+
+    def test_stats_grid(self):
+        with TestClient(app) as client, mock_upstream(self.handler):
+            res = client.get("/stats?users=iwbc_mzk,other,iwbc_mzk&columns=1")
+            assert res.status_code == 200
+            assert res.headers["content-type"] == "image/svg+xml"
+            assert res.headers["x-cache"] == "MISS"
+            assert res.text.count("<image ") == 2
+
+            # 各ユーザーのカードは単体のエンドポイントと同じキャッシュに入る
+            assert client.get("/stats/other").headers["x-cache"] == "HIT"
+            assert client.get("/stats?users=iwbc_mzk,other&columns=1").headers["x-cache"] == "HIT"
+
+            etag = res.headers["etag"]
+            svg_cache.clear()
+            not_modified = client.get(
+                "/stats?users=iwbc_mzk,other&columns=1", headers={"If-None-Match": etag}
+            )
+            assert not_modified.status_code == 304
+
+    def test_stats_grid_error(self):
+        def handler(request):
+            if "missing" in request.url.path:
+                return Response(404)
+            return self.handler(request)
+
+        with TestClient(app) as client, mock_upstream(handler):
+            res = client.get("/stats?users=iwbc_mzk,missing")
+            assert res.status_code == 200
+            assert "no-store" in res.headers["cache-control"]
+            assert res.text.count("<image ") == 2
+
+            too_many = client.get("/stats?users=" + ",".join(f"u{i}" for i in range(100)))
+            assert "Too Many Users." in too_many.text
+
+    def test_stats_bundle(self):
+        def handler(request):
+            if "missing" in request.url.path:
+                return Response(404)
+            return self.handler(request)
+
+        with TestClient(app) as client, mock_upstream(handler):
+            res = client.get("/stats.json?users=iwbc_mzk,missing&theme=darcula")
+            cached = client.get("/stats/iwbc_mzk?theme=darcula")
+            bad = client.get("/stats.json?users=,")
+
+        cards = res.json()["cards"]
+        assert [c["username"] for c in cards] == ["iwbc_mzk", "missing"]
+        assert cards[0]["error"] is None
+        assert cards[0]["svg"] == cached.text
+        assert cards[1]["error"]["message"] == "User Name Not Found."
+        assert cards[1]["svg"].startswith("<svg")
+        assert bad.status_code == 400
+
+    def test_heatmap_team(self):
+        now = int(time.time())
+
+        def handler(request):
+            user = request.url.params["user"]
+            if user == "missing":
+                return Response(500)
+            rows = [
+                {
+                    "id": i,
+                    "epoch_second": now,
+                    "problem_id": f"abc300_{i}",
+                    "contest_id": "abc300",
+                    "user_id": user,
+                    "language": "Python",
+                    "point": 100.0,
+                    "length": 100,
+                    "result": "AC",
+                    "execution_time": 10,
+                }
+                for i in range(3 if user == "a" else 2)
+            ]
+            return Response(200, json=rows)
+
+        # 提出数を確認するためテスト用の属性を出す
+        with TestClient(app) as client, mock_upstream(handler), mock.patch(
+            "api.router.MINIFY_SVG", False
+        ):
+            res = client.get("/heatmap?users=a,b&name=<Team>&disable_animations=true")
+            cached = client.get("/heatmap?users=a,b&name=<Team>&disable_animations=true")
+            failed = client.get("/heatmap?users=a,missing")
+
+        assert res.status_code == 200
+        assert res.headers["x-cache"] == "MISS"
+        assert cached.headers["x-cache"] == "HIT"
+        assert "&lt;Team&gt;'s Atcoder Submission" in res.text
+        # 2人の提出を合計した数になる
+        assert '_test_submission_count="5"' in res.text
+        # 提出のテーブルはキャッシュせず、1人分の日ごとの提出数だけを持つ
+        kinds = {key[0] for key in data_cache._entries}
+        assert kinds == {"heatmap_buckets"}
+
+        assert "no-store" in failed.headers["cache-control"]
+        assert "missing:" in failed.text
@@ -4,6 +4,7 @@ from typing import Union, Literal, Optional
 from bs4 import BeautifulSoup
 import pytest
 
+from src.cards.card import Card
 from src.cards.stats import StatsCard, StatsOption
 from src.atcoder import UserData, Competition
 from src.themes import THEMES
@@ -383,3 +384,23 @@ class TestStatsCard:
             assert len(fadein_elements) == 0
         else:
             assert len(fadein_elements) >= 0
+
+    def test_template_cache(self):
+        Card.clear_templates()
+        other = self.userdata.model_copy(update={"id": "other_user", "rating": 2500})
+
+        svg = StatsCard(self.userdata).render()
+        other_svg = StatsCard(other).render()
+        assert len(Card._templates) == 1
+
+        # テーマが変われば別のテンプレート
+        dark_svg = StatsCard(self.userdata, StatsOption(theme=THEMES["darcula"])).render()
+        assert len(Card._templates) == 2
+
+        # テンプレートを使い回してもユーザーごとの値は反映される
+        soup = BeautifulSoup(other_svg, "html.parser")
+        assert soup.find(id="title").string == "other_user's Atcoder Stats"
+        styles = serialize_css(soup.find("style", id="main-style").string)
+        assert get_property_from_css(styles, ".rating", "color") == get_rating_color(2500)
+        assert svg != other_svg
+        assert THEMES["darcula"].background_color in dark_svg
@@ -0,0 +1,115 @@
+import pickle
+
+import pytest
+
+from src.atcoder_problems import Submission
+from src.day_buckets import DayBuckets
+from src.submission_table import SubmissionTable
+from tests.test_atcoder_problems import make_row
+
+
+class TestSubmissionTable:
+    def setup_method(self):
+        self.rows = [make_row(i, 1000 + i * 3600) for i in range(100)]
+        self.rows[10]["execution_time"] = None
+        self.rows[20]["result"] = "WA"
+
+    def test_from_rows(self):
+        table = SubmissionTable.from_rows(reversed(self.rows))
+
+        assert len(table) == 100
+        assert table.user_id == "iwbc_mzk"
+        assert [row.to_dict() for row in table] == self.rows
+        assert table.to_dicts() == self.rows
+        assert table[10].execution_time is None
+        assert table[-1].id == 99
+        with pytest.raises(IndexError):
+            table[100]
+
+        # 文字列は種類ごとに1つだけ持つ
+        assert len(table.problems) == 7
+        assert len(table.results) == 2
+        assert table.result_codes.itemsize == 1
+
+    def test_row_matches_submission(self):
+        table = SubmissionTable.from_rows(self.rows)
+        for row, raw in zip(table, self.rows):
+            assert Submission(**row.to_dict()) == Submission(**raw)
+
+    def test_from_submissions(self):
+        submissions = [Submission(**row) for row in self.rows]
+        table = SubmissionTable.from_rows(submissions)
+        assert [row.to_dict() for row in table] == self.rows
+
+    def test_since(self):
+        table = SubmissionTable.from_rows(self.rows)
+        since = table.since(1000 + 50 * 3600)
+        assert len(since) == 50
+        assert since[0].id == 50
+        assert since[0].problem_id == table[50].problem_id
+        assert table.since(0) is table
+
+    def test_merge(self):
+        table = SubmissionTable.from_rows(self.rows[:90])
+
+        # 末尾と重なる差分 (ジャッジ結果の更新 + 新しい提出)
+        updated = make_row(89, self.rows[89]["epoch_second"], "TLE")
+        table = table.merge([updated] + self.rows[90:])
+
+        assert len(table) == 100
+        assert [row.id for row in table] == list(range(100))
+        assert table[89].result == "TLE"
+
+    def test_pending_index(self):
+        table = SubmissionTable.from_rows(self.rows)
+        assert table.pending_index({"WJ"}) is None
+        assert table.pending_index({"WA", "WJ"}) == 20
+
+    def test_pickle(self):
+        table = SubmissionTable.from_rows(self.rows)
+        loaded = pickle.loads(pickle.dumps(table))
+        assert [row.to_dict() for row in loaded] == self.rows
+        loaded.append(make_row(100, 10**9, "WJ"))
+        assert loaded.results.get("WJ") == 2
+
+    def test_from_columns(self):
+        table = SubmissionTable.from_rows(self.rows)
+        loaded = SubmissionTable.from_columns(
+            "iwbc_mzk", table.string_tables(), table.columns_bytes(), len(table)
+        )
+        assert loaded.to_dicts() == self.rows
+        assert loaded.fingerprint() == table.fingerprint()
+
+    def test_from_columns_ng(self):
+        table = SubmissionTable.from_rows(self.rows)
+        data, strings = table.columns_bytes(), table.string_tables()
+        with pytest.raises(ValueError):
+            SubmissionTable.from_columns("iwbc_mzk", strings, data[:-1], len(table))
+        with pytest.raises(ValueError):
+            SubmissionTable.from_columns("iwbc_mzk", strings, data + b"\0", len(table))
+        # 文字列表の範囲外を指すインデックス
+        with pytest.raises(ValueError):
+            SubmissionTable.from_columns("iwbc_mzk", {**strings, "results": ["AC"]}, data, len(table))
+
+    @pytest.mark.parametrize("type_", ["all", "ac", "unique_ac"])
+    def test_day_buckets(self, type_):
+        table = SubmissionTable.from_rows(self.rows)
+        submissions = [Submission(**row) for row in self.rows]
+
+        from_table = DayBuckets(0, 10, 0)
+        from_table.add_submissions(table, type_)
+        from_list = DayBuckets(0, 10, 0)
+        from_list.add_submissions(submissions, type_)
+
+        assert from_table.counts == from_list.counts
+        assert sum(from_table.counts) > 0
+
+    def test_fingerprint(self):
+        table = SubmissionTable.from_rows(self.rows)
+        assert table.fingerprint() == SubmissionTable.from_rows(self.rows).fingerprint()
+
+        # ジャッジ結果が変わっただけでも値が変わる
+        before = table.fingerprint()
+        table.merge([make_row(20, self.rows[20]["epoch_second"], "AC")])
+        assert len(table) == 100
+        assert table.fingerprint() != before
@@ -0,0 +1,39 @@
+import asyncio
+
+from src.timing import Timings, collect, phase, timed
+
+
+class TestTimings:
+    def test_server_timing(self):
+        timings = Timings()
+        timings.add("profile", 0.1205)
+        timings.add("submissions_decode", 0.001)
+        timings.add("submissions_decode", 0.002)
+        assert timings.totals() == {"profile": 0.1205, "submissions_decode": 0.003}
+        assert timings.server_timing() == "profile;dur=120.5, submissions_decode;dur=3.0"
+
+    def test_phase_without_collect(self):
+        # 計測中でなければ記録しない
+        with phase("render"):
+            pass
+        with collect() as timings:
+            pass
+        assert timings.phases == []
+
+    def test_timed(self):
+        @timed("sync")
+        def sync():
+            return 1
+
+        @timed("async")
+        async def async_():
+            await asyncio.sleep(0)
+            return 2
+
+        async def run():
+            # 子タスクで記録したものも集める
+            return sync(), await asyncio.create_task(async_())
+
+        with collect() as timings:
+            assert asyncio.run(run()) == (1, 2)
+        assert [name for name, _ in timings.phases] == ["sync", "async"]
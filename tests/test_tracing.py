@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from httpx import Response
+
+from api.router import app, svg_cache, data_cache
+from src.submission_store import SubmissionStore
+from src.tracing import TracingMiddleware, jsonl_sink, span
+from tests.utils import mock_upstream
+
+
+class TestTracing:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(SubmissionStore, "directory", str(tmp_path))
+        svg_cache.clear()
+        data_cache.clear()
+        self.records = []
+
+    def handler(self, request):
+        return Response(200, text="[]")
+
+    def test_sampled(self):
+        traced = TracingMiddleware(app, self.records.append, sample_rate=1.0)
+        with TestClient(traced) as client, mock_upstream(self.handler):
+            client.get("/heatmap/iwbc_mzk")
+
+        assert len(self.records) == 1
+        record = self.records[0]
+        assert record["route"] == "/heatmap/{username}"
+        assert record["path"] == "/heatmap/iwbc_mzk"
+        assert record["status"] == 200
+        assert record["reason"] == "sampled"
+
+        spans = {s["name"]: s for s in record["spans"]}
+        assert {"handler", "submissions", "upstream", "submissions_decode", "render"} <= set(spans)
+        assert spans["handler"]["parent"] is None
+        assert spans["submissions"]["parent"] == spans["handler"]["id"]
+        assert spans["upstream"]["attributes"]["status"] == 200
+        assert "from_second=" in spans["upstream"]["attributes"]["url"]
+        assert all(s["duration_ms"] is not None for s in record["spans"])
+
+    def test_slow_threshold(self):
+        traced = TracingMiddleware(
+            app, self.records.append, sample_rate=0.0, slow_threshold=1e-9
+        )
+        not_traced = TracingMiddleware(
+            app, self.records.append, sample_rate=0.0, slow_threshold=60.0
+        )
+        with mock_upstream(self.handler):
+            with TestClient(not_traced) as client:
+                client.get("/heatmap/iwbc_mzk")
+            with TestClient(traced) as client:
+                client.get("/heatmap/iwbc_mzk")
+
+        assert [r["reason"] for r in self.records] == ["slow"]
+
+    def test_span_without_trace(self):
+        with span("render") as s:
+            assert s is None
+
+    def test_jsonl_sink(self, tmp_path):
+        path = str(tmp_path / "traces" / "traces.jsonl")
+        write = jsonl_sink(path, max_bytes=100, backup_count=2)
+        for i in range(5):
+            write({"trace_id": i, "spans": [], "padding": "x" * 40})
+
+        with open(path, encoding="utf-8") as f:
+            assert json.loads(f.readline())["trace_id"] == 4
+        assert (tmp_path / "traces" / "traces.jsonl.2").exists()
+        assert not (tmp_path / "traces" / "traces.jsonl.3").exists()
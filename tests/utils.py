@@ -1,5 +1,11 @@
+from typing import Callable
+from contextlib import contextmanager
+
 import cssutils
 from cssutils.css import CSSStyleSheet
+import httpx
+
+from src.client import UpstreamClient
 
 
 def get_property_from_css(css, class_or_id, property):
@@ -21,3 +27,32 @@ def serialize_css(css: str) -> CSSStyleSheet:
 
     css = "".join(c)
     return cssutils.parseString(css)
+
+
+@contextmanager
+def mock_upstream(handler: Callable[[httpx.Request], httpx.Response]):
+    # UpstreamClient の通信をトランスポート層で差し替える
+    UpstreamClient.transport = httpx.MockTransport(handler)
+    try:
+        yield
+    finally:
+        UpstreamClient.transport = None
+
+
+class AsyncChunks:
+    # 読み込み済みの本文を chunk_size ずつ返す (ストリーミング取得の代わり)
+    # 途中で読むのをやめても後始末が要らないように、非同期ジェネレーターにはしない
+    def __init__(self, content: bytes, chunk_size: int) -> None:
+        self._content = content
+        self._chunk_size = chunk_size
+        self._pos = 0
+
+    def __aiter__(self) -> "AsyncChunks":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._pos >= len(self._content):
+            raise StopAsyncIteration
+        chunk = self._content[self._pos : self._pos + self._chunk_size]
+        self._pos += self._chunk_size
+        return chunk